@@ -0,0 +1,394 @@
+import asyncio
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+from prometheus_client import make_asgi_app
+from quart import Quart, request, render_template, jsonify
+
+from books_vector_redis_demo import books_by_tag_query, shape_books, book_recommendations_query, \
+    shape_book_recommendations, unified_knn_query, shape_recommended_games, GAME_RECOMMENDATIONS, \
+    BATCH_RECOMMENDATIONS_MAX_IDS, parse_book_ids, unified_index_info_expired, summarize_unified_index_info, \
+    only_games, adaptive_initial_k, adaptive_next_k, games_knn_plan, embeddings_client_for, \
+    queue_neighbors_and_embeddings, unpack_neighbors_and_embeddings, split_batch_recommendations, \
+    merge_batch_recommendations, auto_create_special_gabs_cross_model_game_book_index
+from cache.cache import async_cached_result
+from cache.hot_embeddings import async_cached_embedding_blob
+from cache.redis_utils import get_async_redis_client, get_async_read_redis_client
+from cache.neighbor_tables import BOOK_NEIGHBORS, GAME_NEIGHBORS, neighbors_key, unpack_neighbors
+from config.admission import admission_controlled
+from config.autocomplete import SUGGESTION_SOURCES, async_autocomplete
+from config.instrumentation import instrumented, timed, async_search, with_timeout, STAGE_REDIS, STAGE_DECODE, \
+    STAGE_SHAPING, STAGE_SERIALIZATION
+from config.index_names import BOOKS_INDEX, GAMES_INDEX, UNIFIED_INDEX, UNIFIED_INDEX_ENABLED
+from config.logger_config import setup_logger
+from config.query_guard import query_complexity_error
+from config.storage import STORAGE_LAYOUT, LAYOUT_HASH, EMBEDDING_FIELD, embedding_to_blob
+from search_api import SEARCH_FIELDS, RECOMMENDED_GAME_FIELDS, parse_fields, async_search_page, project, \
+    compact_response
+from semantic_search import SEMANTIC_TARGETS, SEMANTIC_SEARCH_MAX_K, ENCODER_TIMEOUT_SECONDS, get_query_encoder, \
+    semantic_knn_query, shape_semantic_results
+from twitch_igdb_games_to_json import games_by_name_query, shape_games
+
+# Load environment variables
+load_dotenv()
+
+# Setup logger
+logger = setup_logger()
+
+# Bounded pools from the shared factory: when every connection is busy, requests wait up to the pool timeout
+r = get_async_redis_client()
+# Binary connection for FLOAT32 vector blobs, packed neighbor tables and cached results
+r_binary = get_async_redis_client(decode_responses=False)
+# FT.SEARCH, KNN and autocomplete reads, spread over GABS_REDIS_REPLICA_URLS when set
+r_read = get_async_read_redis_client()
+
+app = Quart(__name__)
+
+
+async def get_embedding_blob(key):
+    """Async counterpart of books_vector_redis_demo.get_embedding_blob."""
+    return await async_cached_embedding_blob(key, lambda: fetch_embedding_blob(key))
+
+
+async def fetch_embedding_blob(key):
+    with timed(STAGE_REDIS):
+        if STORAGE_LAYOUT == LAYOUT_HASH:
+            return await r_binary.hget(key, EMBEDDING_FIELD)
+        embedding = await r.json().get(key, "$.embedding")
+    if not embedding:
+        return None
+    with timed(STAGE_DECODE):
+        return embedding_to_blob(embedding)
+
+
+async def get_neighbors(kind, book_id):
+    with timed(STAGE_REDIS):
+        packed = await r_binary.get(neighbors_key(kind, book_id))
+    return unpack_neighbors(packed)
+
+
+_unified_index_info = {}
+
+
+async def get_unified_index_info():
+    """Async counterpart of books_vector_redis_demo.get_unified_index_info; both FT.INFO calls run concurrently."""
+    global _unified_index_info
+    if unified_index_info_expired(_unified_index_info):
+        unified_info, games_info = await asyncio.gather(r_read.ft(UNIFIED_INDEX).info(), r_read.ft(GAMES_INDEX).info(),
+                                                        return_exceptions=True)
+        if isinstance(unified_info, Exception):
+            raise unified_info
+        _unified_index_info = summarize_unified_index_info(
+            unified_info, None if isinstance(games_info, Exception) else games_info)
+    return _unified_index_info
+
+
+async def knn_games(embedding_as_blob, num_results):
+    """Async counterpart of books_vector_redis_demo.knn_games."""
+    info = await get_unified_index_info() if UNIFIED_INDEX_ENABLED else None
+    plan = games_knn_plan(num_results, info)
+    if plan is not None:
+        index_name, query = plan
+        results = await async_search(r_read, index_name, query, query_params={"vec": embedding_as_blob})
+        return results.docs
+
+    k = adaptive_initial_k(info, num_results)
+    while k is not None:
+        results = await async_search(r_read, UNIFIED_INDEX, unified_knn_query(k), query_params={"vec": embedding_as_blob})
+        games = only_games(results.docs)
+        k = adaptive_next_k(info, num_results, k, len(games))
+    return games[:num_results]
+
+
+async def search_books_by_tag(tag):
+    try:
+        results = await async_search(r_read, BOOKS_INDEX, books_by_tag_query(tag))
+        with timed(STAGE_SHAPING):
+            return shape_books(results.docs)
+    except Exception as e:
+        logger.error(f"Error searching books by tag '{tag}': {e}")
+        return []
+
+
+async def search_games_by_name(game_name):
+    if not game_name.strip():
+        return []
+    try:
+        results = await async_search(r_read, GAMES_INDEX, games_by_name_query(game_name))
+        with timed(STAGE_SHAPING):
+            return shape_games(results.docs)
+    except Exception as e:
+        logger.error(f"Error searching games by name '{game_name}': {e}")
+        return []
+
+
+async def get_book_recommendations(book_id):
+    try:
+        # The neighbor table and the embedding are independent lookups, so fetch them concurrently
+        precomputed, embedding_as_blob = await asyncio.gather(get_neighbors(BOOK_NEIGHBORS, book_id),
+                                                              get_embedding_blob(f"book:{book_id}"))
+        if precomputed is not None:
+            return precomputed
+        if not embedding_as_blob:
+            logger.info(f"No embedding found for book ID {book_id}")
+            return []
+        results = await async_search(r_read, BOOKS_INDEX, book_recommendations_query(),
+                                     query_params={"vec": embedding_as_blob})
+        with timed(STAGE_SHAPING):
+            return shape_book_recommendations(results.docs)
+    except Exception as e:
+        logger.error(f"Error getting recommendations for book ID {book_id}: {e}")
+        return []
+
+
+async def get_book_recommendations_many(book_ids):
+    """Async counterpart of books_vector_redis_demo.get_book_recommendations_many."""
+    book_ids = list(dict.fromkeys(str(book_id) for book_id in book_ids))
+    if not book_ids:
+        return {}
+    try:
+        with timed(STAGE_REDIS):
+            pipe = embeddings_client_for(STORAGE_LAYOUT, r, r_binary).pipeline(transaction=False)
+            queue_neighbors_and_embeddings(pipe, book_ids)
+            responses = await pipe.execute()
+        packed_neighbors, blobs = unpack_neighbors_and_embeddings(responses)
+    except Exception as e:
+        logger.error(f"Error fetching embeddings for {len(book_ids)} books: {e}")
+        return {book_id: [] for book_id in book_ids}
+
+    recommendations, pending = split_batch_recommendations(book_ids, packed_neighbors, blobs)
+    responses = []
+    if pending:
+        query = with_timeout(book_recommendations_query())
+        with timed(STAGE_REDIS):
+            pipe = r_read.ft(BOOKS_INDEX).pipeline(transaction=False)
+            for _, embedding_as_blob in pending:
+                await pipe.search(query, query_params={"vec": embedding_as_blob})
+            responses = await pipe.execute(raise_on_error=False)
+    return merge_batch_recommendations(book_ids, recommendations, pending, responses)
+
+
+async def recommend_games_by_book_embedding(book_id, num_results=GAME_RECOMMENDATIONS):
+    try:
+        precomputed, embedding_as_blob = await asyncio.gather(get_neighbors(GAME_NEIGHBORS, book_id),
+                                                              get_embedding_blob(f"book:{book_id}"))
+        if precomputed is not None:
+            return precomputed[:num_results]
+        if not embedding_as_blob:
+            logger.info(f"No embedding found for book ID {book_id}")
+            return []
+        games = await knn_games(embedding_as_blob, num_results)
+        with timed(STAGE_SHAPING):
+            return shape_recommended_games(games)
+    except Exception as e:
+        logger.error(f"Error getting game recommendations for book ID {book_id}: {e}")
+        return []
+
+
+async def semantic_search(text, target="books", k=10):
+    index_name, _ = SEMANTIC_TARGETS[target]
+    k = max(1, min(k, SEMANTIC_SEARCH_MAX_K))
+    try:
+        # The encoder batches this text with the ones other requests are waiting on
+        embedding_as_blob = await asyncio.wait_for(asyncio.wrap_future(get_query_encoder().submit(text)),
+                                                   ENCODER_TIMEOUT_SECONDS)
+        results = await async_search(r_read, index_name, semantic_knn_query(target, k),
+                                     query_params={"vec": embedding_as_blob})
+        with timed(STAGE_SHAPING):
+            return shape_semantic_results(target, results.docs)
+    except Exception as e:
+        logger.error(f"Error running semantic search on {index_name} for '{text}': {e}")
+        return []
+
+
+@app.route('/')
+async def index():
+    return await render_template('books.html')
+
+
+@app.route('/books')
+async def books():
+    return await render_template('books.html')
+
+
+@app.route('/search_books', methods=['POST'])
+@instrumented('search_books')
+@admission_controlled('search_books')
+async def search_books():
+    tag = (await request.form)['tag_query']
+    error = query_complexity_error(tag)
+    if error:
+        return jsonify({"error": error}), 400
+    books = await async_cached_result(r_binary, 'search_books', tag, lambda: search_books_by_tag(tag))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(books)
+
+
+@app.route('/search_games', methods=['POST'])
+@instrumented('search_games')
+@admission_controlled('search_games')
+async def search_games():
+    game_name = (await request.form)['game_query']
+    games = await async_cached_result(r_binary, 'search_games', game_name, lambda: search_games_by_name(game_name))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(games)
+
+
+@app.route('/autocomplete')
+@instrumented('autocomplete')
+@admission_controlled('autocomplete')
+async def autocomplete_endpoint():
+    source = request.args.get('type', 'games')
+    if source not in SUGGESTION_SOURCES:
+        return jsonify({"error": f"type must be one of {sorted(SUGGESTION_SOURCES)}"}), 400
+    suggestions = await async_autocomplete(r_read, source, request.args.get('q', ''),
+                                           fuzzy=request.args.get('fuzzy', 'false').lower() in ('1', 'true', 'yes'),
+                                           max_results=request.args.get('max', type=int))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(suggestions)
+
+
+@app.route('/recommend_books', methods=['POST'])
+@instrumented('recommend_books')
+@admission_controlled('recommend_books')
+async def recommend_books():
+    book_id = (await request.form)['book_id']
+    recommendations = await async_cached_result(r_binary, 'recommend_books', book_id,
+                                                lambda: get_book_recommendations(book_id))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(recommendations)
+
+
+@app.route('/recommend_games', methods=['POST'])
+@instrumented('recommend_games')
+@admission_controlled('recommend_games')
+async def recommend_games():
+    book_id = (await request.form)['book_id']
+    recommendations = await async_cached_result(r_binary, 'recommend_games', book_id,
+                                                lambda: recommend_games_by_book_embedding(book_id))
+    with timed(STAGE_SERIALIZATION):
+        return await render_template('books.html', recommendations=recommendations)
+
+
+@app.route('/recommend_books_batch', methods=['POST'])
+@instrumented('recommend_books_batch')
+@admission_controlled('recommend_books_batch')
+async def recommend_books_batch():
+    book_ids = parse_book_ids(await request.get_json(silent=True), await request.form)
+    if not book_ids:
+        return jsonify({"error": "book_ids is required"}), 400
+    if len(book_ids) > BATCH_RECOMMENDATIONS_MAX_IDS:
+        return jsonify({"error": f"at most {BATCH_RECOMMENDATIONS_MAX_IDS} distinct book_ids per request"}), 400
+    recommendations = await async_cached_result(r_binary, 'recommend_books_batch', ",".join(sorted(book_ids)),
+                                                lambda: get_book_recommendations_many(book_ids))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(recommendations)
+
+
+@app.after_request
+async def compact_api_responses(response):
+    """ETag and gzip for the JSON API."""
+    if not request.path.startswith('/api/') or response.status_code != 200:
+        return response
+    status, body, headers = compact_response(await response.get_data(), request.headers.get('If-None-Match'),
+                                             request.headers.get('Accept-Encoding'))
+    response.set_data(body)
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+async def paged_search(index_name, query_string):
+    fields = parse_fields(request.args.get('fields'), index_name)
+    if fields is None:
+        return jsonify({"error": f"fields must be a subset of {SEARCH_FIELDS[index_name][0]}"}), 400
+    page = await async_search_page(r, index_name, query_string, fields, request.args.get('page_size', type=int),
+                                   request.args.get('cursor'))
+    if page is None:
+        return jsonify({"error": "cursor is invalid or has expired, restart from the first page"}), 410
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(page)
+
+
+@app.route('/api/books/search')
+@instrumented('api_search_books')
+@admission_controlled('api_search_books')
+async def api_search_books():
+    query_string = request.args.get('q', '*')
+    error = query_complexity_error(query_string)
+    if error:
+        return jsonify({"error": error}), 400
+    return await paged_search(BOOKS_INDEX, query_string)
+
+
+@app.route('/api/games/search')
+@instrumented('api_search_games')
+@admission_controlled('api_search_games')
+async def api_search_games():
+    return await paged_search(GAMES_INDEX, games_by_name_query(request.args.get('name', '')).query_string())
+
+
+@app.route('/api/recommend_games')
+@instrumented('api_recommend_games')
+@admission_controlled('api_recommend_games')
+async def api_recommend_games():
+    book_id = request.args.get('book_id', '')
+    fields = parse_fields(request.args.get('fields'), field_spec=RECOMMENDED_GAME_FIELDS)
+    if not book_id or fields is None:
+        return jsonify({"error": "book_id is required and fields must be a subset of "
+                                 f"{RECOMMENDED_GAME_FIELDS[0]}"}), 400
+    recommendations = await async_cached_result(r_binary, 'recommend_games', book_id,
+                                                lambda: recommend_games_by_book_embedding(book_id))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(project(recommendations, fields))
+
+
+@app.route('/semantic_search', methods=['POST'])
+@instrumented('semantic_search')
+@admission_controlled('semantic_search')
+async def semantic_search_endpoint():
+    form = await request.form
+    text = form['query']
+    target = form.get('index', 'books')
+    k = form.get('k', 10, type=int)
+    if target not in SEMANTIC_TARGETS:
+        return jsonify({"error": f"index must be one of {sorted(SEMANTIC_TARGETS)}"}), 400
+    results = await async_cached_result(r_binary, 'semantic_search', f"{target}|{k}|{text}",
+                                        lambda: semantic_search(text, target, k))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(results)
+
+
+@app.before_serving
+async def ensure_unified_index():
+    """Create the unified index once at startup, as the Flask app does before its first game recommendation."""
+    if not UNIFIED_INDEX_ENABLED:
+        return
+    try:
+        # index_versions works on a sync client, so keep it off the event loop
+        await asyncio.to_thread(auto_create_special_gabs_cross_model_game_book_index)
+    except Exception as e:
+        logger.error(f"Error ensuring the unified index: {e}")
+
+
+@app.after_serving
+async def close_redis_pools():
+    await r.aclose()
+    await r_binary.aclose()
+    await r_read.aclose()
+
+
+metrics_app = make_asgi_app()
+
+
+async def asgi(scope, receive, send):
+    """ASGI entry point: the Quart app, with Prometheus metrics mounted on /metrics."""
+    if scope["type"] == "http" and scope["path"].startswith("/metrics"):
+        return await metrics_app(scope, receive, send)
+    return await app(scope, receive, send)
+
+
+if __name__ == "__main__":
+    uvicorn.run("asgi_app:asgi", host='0.0.0.0', port=int(os.getenv('GABS_ASGI_PORT', 5000)),
+                workers=int(os.getenv('GABS_ASGI_WORKERS', 1)))
@@ -0,0 +1,186 @@
+"""
+Memory saved against recall lost by the compact vector options.
+
+Embeds a sample of the games and books catalogs, then indexes the game vectors under throwaway prefixes once per
+variant: FLOAT32 or FLOAT16, at the model's 384 dimensions or PCA-reduced to each of --dims. Each variant is scored
+on the book -> game recommendation path (the KNN games of a book's vector) with recall@k against exact FLOAT32
+384-dimension brute force, next to its vector index size (FT.INFO) and per-document memory.
+
+It also reports what disabling unified_idx (GABS_UNIFIED_INDEX=false) saves: the size of a second graph over games
+and books, and the recall of its doc_type-filtered KNN next to the plain games-only KNN that replaces it.
+
+Run it against a throwaway Redis: every key it writes is deleted afterwards.
+
+Usage: python -m benchmarks.compact_vectors --games 20000 --books 2000 --dims 64,128,192
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+from redis.commands.search.field import TagField, VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+
+from books_vector_redis_demo import DATA_FOLDER, build_book_text
+from cache.embedding_store import encode_texts
+from cache.redis_utils import get_redis_client, get_binary_redis_client
+from config.catalog import GAMES_CATALOG_DIR, BOOKS_CATALOG_DIR, resolve_source, iter_records
+from config.projection import MODEL_DIM, fit_projection, apply_projection
+from config.vector_index import hnsw_params
+from config.index_names import GAMES_INDEX
+from vectorize_igdb_in_redis_as_json import DATA_FILE, build_game_text
+
+r = get_redis_client()
+r_binary = get_binary_redis_client()
+
+PREFIX = "compact_bench"
+DTYPES = {"FLOAT32": np.float32, "FLOAT16": np.float16}
+WRITE_BATCH_SIZE = 1000
+
+
+def parse_ints(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def normalize(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def sample_embeddings(num_games, num_books):
+    """Embed the first num_games games and num_books books of the catalogs."""
+    games = itertools.islice(iter_records(resolve_source(GAMES_CATALOG_DIR, DATA_FILE)), num_games)
+    books = itertools.islice(iter_records(resolve_source(BOOKS_CATALOG_DIR, DATA_FOLDER)), num_books)
+    game_vectors = encode_texts([build_game_text(game) for game in games])
+    book_vectors = encode_texts([build_book_text(book) for book in books])
+    return normalize(game_vectors), normalize(book_vectors)
+
+
+def brute_force_neighbors(candidates, queries, k):
+    similarities = queries @ candidates.T
+    return [set(row) for row in np.argpartition(-similarities, k, axis=1)[:, :k]]
+
+
+def load_variant(name, vectors, dtype, doc_type=None, start=0):
+    """Write vectors as HASH documents under the variant's prefix. Returns the keys."""
+    keys = []
+    pipe = r_binary.pipeline(transaction=False)
+    for i, vector in enumerate(vectors, start):
+        key = f"{PREFIX}:{name}:{i}"
+        mapping = {"embedding": np.asarray(vector, dtype=dtype).tobytes()}
+        if doc_type:
+            mapping["doc_type"] = doc_type
+        pipe.hset(key, mapping=mapping)
+        keys.append(key)
+        if len(keys) % WRITE_BATCH_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+    return keys
+
+
+def build_index(name, vector_type, dim, capacity):
+    index_name = f"{PREFIX}_{name}_idx"
+    attributes = {"TYPE": vector_type, "DIM": dim, "DISTANCE_METRIC": "COSINE",
+                  **hnsw_params(GAMES_INDEX), "INITIAL_CAP": capacity}
+    schema = [TagField("doc_type"), VectorField("embedding", "HNSW", attributes)]
+    r.ft(index_name).create_index(fields=schema,
+                                  definition=IndexDefinition(prefix=[f"{PREFIX}:{name}:"], index_type=IndexType.HASH))
+    while float(r.ft(index_name).info().get("percent_indexed", 1)) < 1:
+        time.sleep(0.2)
+    return index_name
+
+
+def knn_recall(index_name, queries, truth, positions, k, dtype, doc_type=None):
+    base = f"(@doc_type:{{{doc_type}}})" if doc_type else "*"
+    query = Query(f"{base}=>[KNN {k} @embedding $vec AS score]").sort_by("score").return_fields("score").paging(
+        0, k).dialect(2)
+    recalls = []
+    for vector, expected in zip(queries, truth):
+        docs = r.ft(index_name).search(query, query_params={"vec": np.asarray(vector, dtype=dtype).tobytes()}).docs
+        recalls.append(len({positions.get(doc.id) for doc in docs} & expected) / k)
+    return float(np.mean(recalls))
+
+
+def memory_per_doc(keys, samples=200):
+    step = max(1, len(keys) // samples)
+    return float(np.mean([r.memory_usage(key, samples=0) or 0 for key in keys[::step]]))
+
+
+def drop(index_name):
+    r.ft(index_name).dropindex(delete_documents=True)
+
+
+def run_variant(name, vector_type, game_vectors, queries, truth, k):
+    dtype = DTYPES[vector_type]
+    keys = load_variant(name, game_vectors, dtype)
+    index_name = build_index(name, vector_type, game_vectors.shape[1], len(keys))
+    try:
+        positions = {key: i for i, key in enumerate(keys)}
+        return {
+            "variant": name,
+            "bytes/vector": game_vectors.shape[1] * np.dtype(dtype).itemsize,
+            "bytes/doc": memory_per_doc(keys),
+            "index_mb": float(r.ft(index_name).info().get("vector_index_sz_mb", 0)),
+            "recall": knn_recall(index_name, queries, truth, positions, k, dtype),
+        }
+    finally:
+        drop(index_name)
+
+
+def unified_overhead(game_vectors, book_vectors, queries, truth, k):
+    """Size of a unified graph over games and books, and its filtered recall, next to the games-only variant."""
+    game_keys = load_variant("unified", game_vectors, np.float32, doc_type="game")
+    load_variant("unified", book_vectors, np.float32, doc_type="book", start=len(game_keys))
+    index_name = build_index("unified", "FLOAT32", MODEL_DIM, len(game_vectors) + len(book_vectors))
+    try:
+        positions = {key: i for i, key in enumerate(game_keys)}
+        return {
+            "index_mb": float(r.ft(index_name).info().get("vector_index_sz_mb", 0)),
+            "recall": knn_recall(index_name, queries, truth, positions, k, np.float32, doc_type="game"),
+        }
+    finally:
+        drop(index_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=20000, help="games to index")
+    parser.add_argument("--books", type=int, default=2000, help="books, used as queries and to fit the PCA")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", type=parse_ints, default=[64, 128, 192], help="PCA dimensions to try")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    game_vectors, book_vectors = sample_embeddings(args.games, args.books)
+    queries = book_vectors[:args.queries]
+    truth = brute_force_neighbors(game_vectors, queries, args.k)
+    print(f"{len(game_vectors)} games, {len(book_vectors)} books, {len(queries)} book -> game queries, k={args.k}")
+
+    mean, components = fit_projection(np.concatenate([game_vectors, book_vectors]), max(args.dims))
+    rows = []
+    for dim in [MODEL_DIM] + sorted(args.dims):
+        if dim == MODEL_DIM:
+            games_at_dim, queries_at_dim = game_vectors, queries
+        else:
+            games_at_dim = apply_projection(game_vectors, mean, components[:dim])
+            queries_at_dim = apply_projection(queries, mean, components[:dim])
+        for vector_type in DTYPES:
+            rows.append(run_variant(f"{vector_type.lower()}_{dim}", vector_type, games_at_dim, queries_at_dim,
+                                    truth, args.k))
+
+    baseline = rows[0]
+    print(f"variant | bytes/vector | bytes/doc | vector index MB | memory saved | recall@{args.k} | recall lost")
+    for row in rows:
+        saved = 1 - row["index_mb"] / baseline["index_mb"] if baseline["index_mb"] else 0.0
+        print(f"{row['variant']} | {row['bytes/vector']} | {row['bytes/doc']:.0f} | {row['index_mb']:.2f} | "
+              f"{saved:.1%} | {row['recall']:.4f} | {baseline['recall'] - row['recall']:.4f}")
+
+    unified = unified_overhead(game_vectors, book_vectors, queries, truth, args.k)
+    print(f"\nunified_idx (games + books, FLOAT32 {MODEL_DIM}): {unified['index_mb']:.2f} MB of vector index, "
+          f"filtered recall@{args.k} {unified['recall']:.4f}")
+    print(f"Disabling it (GABS_UNIFIED_INDEX=false) saves those {unified['index_mb']:.2f} MB; games_idx KNN with the "
+          f"book vector reaches recall@{args.k} {baseline['recall']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
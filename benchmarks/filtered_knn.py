@@ -0,0 +1,65 @@
+"""
+Latency and result-count comparison of the game recommendation strategies on the unified index:
+
+- overfetch: KNN 20 over books and games, books dropped in Python (the original behaviour)
+- filtered:  KNN N pre-filtered to games with the doc_type tag
+- adaptive:  KNN sized by the share of games in the index, doubled until N games are found
+
+Runs against the books and games currently loaded in GABS_REDIS_URL (the unified index needs the doc_type tag for the
+filtered strategy, see backfill_doc_types).
+
+Usage: python -m benchmarks.filtered_knn [num_queries] [num_results]
+"""
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from books_vector_redis_demo import r, get_embedding_blob, knn_games_overfetch, knn_games_filtered, \
+    knn_games_adaptive
+
+
+def sample_book_keys(num_queries):
+    keys = []
+    for key in r.scan_iter(match="book:*", count=1000):
+        keys.append(key)
+        if len(keys) >= num_queries:
+            break
+    return keys
+
+
+def run(strategy, blobs):
+    latencies_ms = []
+    counts = []
+    for blob in blobs:
+        started = time.perf_counter()
+        games = strategy(blob)
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        counts.append(len(games))
+    return latencies_ms, counts
+
+
+def main(num_queries=200, num_results=10):
+    blobs = [blob for blob in (get_embedding_blob(key) for key in sample_book_keys(num_queries)) if blob]
+    if not blobs:
+        print("No books with embeddings found.")
+        return
+
+    strategies = {
+        "overfetch (KNN 20)": lambda blob: knn_games_overfetch(blob, 20),
+        f"filtered (KNN {num_results})": lambda blob: knn_games_filtered(blob, num_results),
+        f"adaptive (N={num_results})": lambda blob: knn_games_adaptive(blob, num_results),
+    }
+    print(f"{len(blobs)} seed books")
+    print("strategy | p50 ms | p95 ms | mean games | min games | queries with < N games")
+    for name, strategy in strategies.items():
+        latencies_ms, counts = run(strategy, blobs)
+        short = sum(1 for count in counts if count < num_results)
+        print(f"{name} | {np.percentile(latencies_ms, 50):.3f} | {np.percentile(latencies_ms, 95):.3f} | "
+              f"{statistics.mean(counts):.1f} | {min(counts)} | {short}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
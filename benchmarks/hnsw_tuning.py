@@ -0,0 +1,188 @@
+"""
+HNSW parameter tuning for books_idx, games_idx and unified_idx.
+
+For each candidate (M, EF_CONSTRUCTION) a throwaway index with the app's schema is built over the documents the real
+index covers, and every EF_RUNTIME is queried against it. Each configuration is scored on recall@k against exact
+NumPy brute-force neighbors, query latency, build time and vector index memory (FT.INFO), and the configurations on
+the Pareto front (no other one is at least as good on recall, latency and memory) are marked. The winner can then be
+set through the GABS_<INDEX>_HNSW_* variables (see config.vector_index) without touching the code.
+
+Runs against the documents currently loaded in GABS_REDIS_URL (benchmarks.synthetic_catalog can fill a throwaway
+Redis). Candidate indexes are dropped afterwards, documents are never touched.
+
+Usage: python -m benchmarks.hnsw_tuning games_idx --m 8,16,32 --ef-construction 100,200,400 --ef-runtime 10,50,200
+"""
+import argparse
+import time
+
+import numpy as np
+from redis.commands.search.query import Query
+
+from cache.redis_utils import get_redis_client, get_binary_redis_client
+from config.index_manager import INDEX_SCHEMAS
+from config.index_names import BOOKS_INDEX, GAMES_INDEX, UNIFIED_INDEX
+from config.index_versions import indexing_progress
+from config.storage import STORAGE_LAYOUT, LAYOUT_HASH, EMBEDDING_FIELD, embedding_to_blob, blob_to_vector
+from config.vector_index import env_prefix, hnsw_params
+
+r = get_redis_client()
+r_binary = get_binary_redis_client()
+
+FETCH_BATCH_SIZE = 1000
+
+# Key prefixes each index covers, i.e. the documents of the ground truth
+INDEX_PREFIXES = {
+    BOOKS_INDEX: ["book:"],
+    GAMES_INDEX: ["game:"],
+    UNIFIED_INDEX: ["game:", "book:"],
+}
+
+
+def parse_ints(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def load_embeddings(prefixes, layout=STORAGE_LAYOUT):
+    """Return (keys, normalized embedding matrix) of every document under prefixes."""
+    keys = [key for prefix in prefixes for key in r.scan_iter(match=f"{prefix}*", count=FETCH_BATCH_SIZE)]
+    vectors = []
+    for start in range(0, len(keys), FETCH_BATCH_SIZE):
+        batch = keys[start:start + FETCH_BATCH_SIZE]
+        if layout == LAYOUT_HASH:
+            pipe = r_binary.pipeline(transaction=False)
+            for key in batch:
+                pipe.hget(key, EMBEDDING_FIELD)
+            vectors += [blob_to_vector(blob) if blob else None for blob in pipe.execute()]
+        else:
+            pipe = r.pipeline(transaction=False)
+            for key in batch:
+                pipe.json().get(key, "$.embedding")
+            vectors += [np.asarray(embedding[0], dtype=np.float32) if embedding else None
+                        for embedding in pipe.execute()]
+    kept = [(key, vector) for key, vector in zip(keys, vectors) if vector is not None]
+    matrix = np.stack([vector for _, vector in kept])
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return [key for key, _ in kept], matrix
+
+
+def sample_queries(matrix, num_queries, noise=0.05, seed=7):
+    """Perturbed copies of random documents, so queries land where real ones do without being exact duplicates."""
+    rng = np.random.default_rng(seed)
+    queries = matrix[rng.choice(len(matrix), size=min(num_queries, len(matrix)), replace=False)]
+    queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * noise
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def brute_force_neighbors(matrix, queries, k):
+    """Exact cosine top-k document indices of each query."""
+    similarities = queries @ matrix.T
+    top = np.argpartition(-similarities, k, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def knn_query(k, ef_runtime):
+    return (Query(f"*=>[KNN {k} @embedding $vec EF_RUNTIME {ef_runtime} AS score]")
+            .sort_by("score").return_fields("score").paging(0, k).dialect(2))
+
+
+def build_candidate(alias, m, ef_construction):
+    """Build a throwaway copy of alias with the given graph parameters. Returns (index name, build seconds)."""
+    index_name = f"hnsw_tune_{alias}_m{m}_efc{ef_construction}"
+    if index_name in r.execute_command("FT._LIST"):
+        r.execute_command("FT.DROPINDEX", index_name)
+    schema, index_def = INDEX_SCHEMAS[alias](STORAGE_LAYOUT, hnsw={"M": m, "EF_CONSTRUCTION": ef_construction})
+    started = time.perf_counter()
+    r.ft(index_name).create_index(fields=schema, definition=index_def)
+    while indexing_progress(index_name) < 1:
+        time.sleep(0.2)
+    return index_name, time.perf_counter() - started
+
+
+def measure(index_name, keys, queries, truth, k, ef_runtime):
+    """Return (mean recall@k, p50 ms, p99 ms) of the queries at ef_runtime."""
+    key_positions = {key: position for position, key in enumerate(keys)}
+    query = knn_query(k, ef_runtime)
+    recalls = []
+    latencies_ms = []
+    for vector, expected in zip(queries, truth):
+        started = time.perf_counter()
+        docs = r.ft(index_name).search(query, query_params={"vec": embedding_to_blob(vector)}).docs
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        found = {key_positions.get(doc.id) for doc in docs}
+        recalls.append(len(found & expected) / k)
+    return float(np.mean(recalls)), float(np.percentile(latencies_ms, 50)), float(np.percentile(latencies_ms, 99))
+
+
+def pareto_front(rows):
+    """Mark the rows no other row beats on recall, p50 latency and memory at once."""
+    def dominates(a, b):
+        at_least = (a["recall"] >= b["recall"] and a["p50_ms"] <= b["p50_ms"] and a["index_mb"] <= b["index_mb"])
+        better = (a["recall"] > b["recall"] or a["p50_ms"] < b["p50_ms"] or a["index_mb"] < b["index_mb"])
+        return at_least and better
+
+    for row in rows:
+        row["pareto"] = not any(dominates(other, row) for other in rows if other is not row)
+    return rows
+
+
+def recommend(rows, target_recall):
+    """The fastest configuration reaching target_recall (the most accurate one if none does)."""
+    reaching = [row for row in rows if row["recall"] >= target_recall]
+    if not reaching:
+        return max(rows, key=lambda row: (row["recall"], -row["p50_ms"]))
+    return min(reaching, key=lambda row: (row["p50_ms"], row["index_mb"]))
+
+
+def tune(alias, ms, ef_constructions, ef_runtimes, k=10, num_queries=200):
+    keys, matrix = load_embeddings(INDEX_PREFIXES[alias])
+    queries = sample_queries(matrix, num_queries)
+    truth = brute_force_neighbors(matrix, queries, k)
+    print(f"{alias}: {len(keys)} documents, {len(queries)} queries, ground truth by brute force")
+
+    rows = []
+    for m in ms:
+        for ef_construction in ef_constructions:
+            index_name, build_seconds = build_candidate(alias, m, ef_construction)
+            try:
+                index_mb = float(r.ft(index_name).info().get("vector_index_sz_mb", 0))
+                for ef_runtime in ef_runtimes:
+                    recall, p50_ms, p99_ms = measure(index_name, keys, queries, truth, k, ef_runtime)
+                    rows.append({"M": m, "EF_CONSTRUCTION": ef_construction, "EF_RUNTIME": ef_runtime,
+                                 "recall": recall, "p50_ms": p50_ms, "p99_ms": p99_ms,
+                                 "build_s": build_seconds, "index_mb": index_mb})
+            finally:
+                r.execute_command("FT.DROPINDEX", index_name)
+    return pareto_front(rows)
+
+
+def print_table(rows, k):
+    print(f"M | EF_CONSTRUCTION | EF_RUNTIME | recall@{k} | p50 ms | p99 ms | build s | index MB | pareto")
+    for row in sorted(rows, key=lambda row: (-row["recall"], row["p50_ms"])):
+        print(f"{row['M']} | {row['EF_CONSTRUCTION']} | {row['EF_RUNTIME']} | {row['recall']:.4f} | "
+              f"{row['p50_ms']:.3f} | {row['p99_ms']:.3f} | {row['build_s']:.1f} | {row['index_mb']:.1f} | "
+              f"{'*' if row['pareto'] else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("alias", choices=list(INDEX_SCHEMAS))
+    parser.add_argument("--m", type=parse_ints, default=[8, 16, 32])
+    parser.add_argument("--ef-construction", type=parse_ints, default=[100, 200, 400])
+    parser.add_argument("--ef-runtime", type=parse_ints, default=[10, 50, 100, 200])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    print(f"Current configuration: {hnsw_params(args.alias)}")
+    rows = tune(args.alias, args.m, args.ef_construction, args.ef_runtime, args.k, args.queries)
+    print_table(rows, args.k)
+    best = recommend(rows, args.target_recall)
+    print(f"\nFastest configuration with recall@{args.k} >= {args.target_recall} "
+          f"({best['recall']:.4f}, p50 {best['p50_ms']:.3f} ms):")
+    for name in ("M", "EF_CONSTRUCTION", "EF_RUNTIME"):
+        print(f"{env_prefix(args.alias)}{name}={best[name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Local stand-in for igdb.wrapper.IGDBWrapper, and a benchmark of the IGDB fetcher against it.
+
+The stub serves synthetic games page by page with a simulated response latency, and records how many requests were
+open at once and how many exceeded the per-second rate limit, so the fetcher can be exercised without Twitch
+credentials or network access.
+"""
+import collections
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from benchmarks.synthetic_catalog import synthetic_games
+
+QUERY_PAGE = re.compile(r"limit (\d+);\s*offset (\d+);")
+
+
+class StubIGDBWrapper:
+    """Serves `games` through the IGDBWrapper `api_request(endpoint, query)` interface."""
+
+    def __init__(self, games, latency_seconds=0.25, rate_limit=4, failure_rate=0.0, seed=0):
+        self.games = games
+        self.latency_seconds = latency_seconds
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.rate_violations = 0
+        self.peak_in_flight = 0
+        self._in_flight = 0
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def api_request(self, endpoint, query):
+        limit, offset = (int(value) for value in QUERY_PAGE.search(query).groups())
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            self._recent.append(now)
+            while self._recent and now - self._recent[0] >= 1:
+                self._recent.popleft()
+            if len(self._recent) > self.rate_limit:
+                self.rate_violations += 1
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+            fail = self._rng.random() < self.failure_rate
+        try:
+            time.sleep(self.latency_seconds)
+            if fail:
+                raise RuntimeError("429 Too Many Requests")
+            return json.dumps(self.games[offset:offset + limit]).encode("utf-8")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def bench_igdb_fetch(num_games, workdir, latency_seconds=0.25, concurrency=None):
+    """Fetch num_games from the stub into a file and check the result; returns throughput and limiter stats."""
+    from twitch_igdb_games_to_json import IGDB_CONCURRENCY, fetch_all_games
+
+    games = synthetic_games(num_games)
+    stub = StubIGDBWrapper(games, latency_seconds=latency_seconds)
+    output_file = os.path.join(workdir, "igdb_games_list.json")
+    started = time.perf_counter()
+    count = fetch_all_games(stub, output_file, checkpoint_file=os.path.join(workdir, "igdb_fetch.checkpoint"),
+                            resume=False, concurrency=concurrency or IGDB_CONCURRENCY)
+    seconds = time.perf_counter() - started
+    with open(output_file, 'r', encoding="utf-8") as file:
+        complete = json.load(file) == games
+    return {
+        "games": count,
+        "complete": complete,
+        "requests": stub.requests,
+        "rate_violations": stub.rate_violations,
+        "peak_in_flight": stub.peak_in_flight,
+        "fetch_seconds": round(seconds, 2),
+        "games_per_sec": round(count / seconds, 1) if seconds > 0 else None,
+    }
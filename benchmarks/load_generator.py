@@ -0,0 +1,105 @@
+"""
+Closed-loop HTTP load generator for the search and recommendation endpoints.
+
+Each of `concurrency` workers keeps exactly one request in flight for `duration` seconds. Reports throughput and
+p50/p95/p99 latency per endpoint.
+
+In the "cached" query mode every worker picks a random input from a small set, so after warm-up the run mostly measures
+result cache hits. In the "uncached" mode the workers share one shuffled pool of distinct inputs and never send the same
+one twice until it runs out, so every request reaches Redis Search. Start that run with a cold cache (bump the index
+version), and size the catalog so that `repeated_requests` stays at 0.
+"""
+import functools
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+QUERY_CACHED = "cached"
+QUERY_UNCACHED = "uncached"
+QUERY_MODES = (QUERY_CACHED, QUERY_UNCACHED)
+
+# Endpoint -> (form field, key of the catalog inputs of the cached mode, key of those of the uncached mode)
+ENDPOINTS = {
+    "/search_books": ("tag_query", "tags", "unique_tags"),
+    "/search_games": ("game_query", "game_names", "unique_game_names"),
+    "/recommend_books": ("book_id", "book_ids", "book_ids"),
+    "/recommend_games": ("book_id", "book_ids", "book_ids"),
+}
+
+
+class DistinctInputs:
+    """Thread-safe source of the inputs of a pool in shuffled order, counting the draws past its end."""
+
+    def __init__(self, values, seed=0):
+        values = list(values)
+        random.Random(seed).shuffle(values)
+        self.size = len(values)
+        self._values = itertools.cycle(values)
+        self._drawn = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self._drawn += 1
+            return next(self._values)
+
+    @property
+    def repeated(self):
+        return max(self._drawn - self.size, 0)
+
+
+def _worker(url, field, next_value, stop_at):
+    latencies = []
+    errors = 0
+    with requests.Session() as session:
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                response = session.post(url, data={field: next_value()}, timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += 0 if ok else 1
+    return latencies, errors
+
+
+def run_endpoint(base_url, endpoint, inputs, concurrency=16, duration=10.0, query_mode=QUERY_CACHED):
+    field, cached_key, uncached_key = ENDPOINTS[endpoint]
+    if query_mode == QUERY_UNCACHED:
+        distinct = DistinctInputs(inputs[uncached_key])
+        sources = [distinct] * concurrency
+    else:
+        distinct = None
+        sources = [functools.partial(random.Random(seed).choice, inputs[cached_key]) for seed in range(concurrency)]
+    stop_at = time.perf_counter() + duration
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(_worker, f"{base_url}{endpoint}", field, source, stop_at) for source in sources]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array([latency for worker_latencies, _ in results for latency in worker_latencies]) * 1000
+    errors = sum(worker_errors for _, worker_errors in results)
+    repeated = {"repeated_requests": distinct.repeated} if distinct else {}
+    if not len(latencies_ms):
+        return {"requests": 0, "errors": errors, **repeated}
+    return {
+        "requests": int(len(latencies_ms)),
+        "errors": errors,
+        **repeated,
+        "throughput_rps": round(len(latencies_ms) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+    }
+
+
+def run_all(base_url, inputs, concurrency=16, duration=10.0, endpoints=tuple(ENDPOINTS), query_mode=QUERY_CACHED):
+    return {endpoint: run_endpoint(base_url, endpoint, inputs, concurrency, duration, query_mode)
+            for endpoint in endpoints}
@@ -0,0 +1,82 @@
+"""
+Microbenchmarks for the embedding-conversion paths and for both loaders.
+"""
+import json
+import os
+import time
+import timeit
+
+import numpy as np
+
+from benchmarks.synthetic_catalog import write_catalog_files
+from config.projection import VECTOR_DIM
+from config.storage import VECTOR_DTYPE, embedding_to_blob, blob_to_embedding
+
+
+def _per_op_us(statement, number):
+    return round(min(timeit.repeat(statement, number=number, repeat=3)) / number * 1e6, 2)
+
+
+def bench_embedding_conversions(number=2000):
+    """Microseconds per conversion for each way the read path can turn a stored embedding into a KNN blob."""
+    vector = np.random.default_rng(0).standard_normal(VECTOR_DIM).astype(np.float32)
+    as_list = vector.tolist()
+    as_jsonpath_result = [as_list]
+    as_json_text = json.dumps(as_jsonpath_result)
+    as_blob = vector.astype(VECTOR_DTYPE).tobytes()
+    return {
+        "json_text_parse_to_blob_us": _per_op_us(lambda: embedding_to_blob(json.loads(as_json_text)), number),
+        "jsonpath_list_to_blob_us": _per_op_us(lambda: embedding_to_blob(as_jsonpath_result), number),
+        "list_to_blob_us": _per_op_us(lambda: np.array(as_list, dtype=VECTOR_DTYPE).tobytes(), number),
+        "hash_blob_passthrough_us": _per_op_us(lambda: bytes(as_blob), number),
+        "blob_to_list_us": _per_op_us(lambda: blob_to_embedding(as_blob), number),
+    }
+
+
+def _rate(records, seconds):
+    return round(records / seconds, 1) if seconds > 0 else None
+
+
+def bench_loaders(num_books, num_games, workdir):
+    """
+    Records/sec of the book loader and of both game loaders, with a cold and then a warm embedding cache.
+    Loads into the configured Redis under the real prefixes, so only run it against a throwaway instance.
+    """
+    # Imported here so that the caller can point GABS_EMBEDDING_CACHE_DIR at a scratch directory first
+    from books_vector_redis_demo import load_books_into_redis
+    from vectorize_igdb_in_redis_as_json import load_games_into_redis, bulk_load_games_into_redis
+
+    books_dir, games_file = write_catalog_files(workdir, num_books, num_games)
+    results = {}
+    for cache_state in ("cold", "warm"):
+        started = time.perf_counter()
+        load_books_into_redis(books_dir)
+        results[f"books_loader_{cache_state}_per_sec"] = _rate(num_books, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        load_games_into_redis(games_file)
+        results[f"games_loader_{cache_state}_per_sec"] = _rate(num_games, time.perf_counter() - started)
+
+        # The cold pass above already filled the cache for the bulk loader, so only measure it warm
+        if cache_state == "warm":
+            started = time.perf_counter()
+            bulk_load_games_into_redis(games_file, checkpoint_file=None)
+            results["games_bulk_loader_warm_per_sec"] = _rate(num_games, time.perf_counter() - started)
+    results["embedding_cache_dir"] = os.getenv("GABS_EMBEDDING_CACHE_DIR")
+    return results
+
+
+def bench_postgres_loader(num_games, workdir, database_url, workers=(1, 4)):
+    """
+    Rows/sec of the COPY bulk loader for each worker count. Replaces the games table of database_url, so only point
+    it at a throwaway local PostgreSQL.
+    """
+    from loader_to_postgres_games import bulk_load_games_into_postgres
+
+    _, games_file = write_catalog_files(workdir, 0, num_games)
+    results = {}
+    for worker_count in workers:
+        stats = bulk_load_games_into_postgres(games_file, database_url, workers=worker_count)
+        results[f"copy_{worker_count}_workers_per_sec"] = _rate(stats['rows'], stats['copy_seconds'])
+        results[f"total_{worker_count}_workers_per_sec"] = _rate(stats['rows'], stats['total_seconds'])
+    return results
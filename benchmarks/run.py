@@ -0,0 +1,134 @@
+"""
+End-to-end benchmark suite.
+
+1. Loads a synthetic catalog (random vectors) into Redis and builds the app's indexes.
+2. Drives the HTTP endpoints of a running app (Flask or ASGI) and reports throughput and p50/p95/p99 latency, with
+   repeated queries (mostly result cache hits) and with distinct queries from a cold cache (every request reaches
+   Redis Search).
+3. Runs the embedding-conversion and loader microbenchmarks, and the IGDB fetcher against a local stub.
+4. Compares the results with a saved baseline and flags regressions beyond the tolerance.
+
+Run it against a throwaway local Redis Stack, e.g.:
+
+    docker run -d -p 6379:6379 redis/redis-stack-server:latest
+    GABS_REDIS_URL=redis://localhost:6379 python main.py &
+    GABS_REDIS_URL=redis://localhost:6379 python -m benchmarks.run --books 2000 --games 20000 --save-baseline
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def is_lower_better(metric):
+    return metric.endswith(("_ms", "_us", "_seconds"))
+
+
+def is_higher_better(metric):
+    return metric.endswith(("_rps", "_per_sec"))
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def find_regressions(results, baseline, tolerance):
+    """Return (metric, baseline value, current value) for every metric that got worse by more than tolerance."""
+    current = flatten(results)
+    regressions = []
+    for metric, before in flatten(baseline).items():
+        after = current.get(metric)
+        if after is None or not before:
+            continue
+        if is_lower_better(metric.rsplit(".", 1)[-1]) and after > before * (1 + tolerance):
+            regressions.append((metric, before, after))
+        elif is_higher_better(metric.rsplit(".", 1)[-1]) and after < before * (1 - tolerance):
+            regressions.append((metric, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--books", type=int, default=1000, help="synthetic books to load")
+    parser.add_argument("--games", type=int, default=10000, help="synthetic games to load")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--query-mode", choices=("cached", "uncached", "both"), default="both",
+                        help="repeat a few queries (cache hits), send distinct ones from a cold cache, or both")
+    parser.add_argument("--loader-books", type=int, default=200, help="books for the loader microbenchmark")
+    parser.add_argument("--loader-games", type=int, default=2000, help="games for the loader microbenchmark")
+    parser.add_argument("--igdb-games", type=int, default=5000, help="games for the stubbed IGDB fetch benchmark")
+    parser.add_argument("--postgres-url", help="also benchmark the COPY loader against this throwaway PostgreSQL")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--skip-loaders", action="store_true")
+    parser.add_argument("--skip-igdb", action="store_true")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gabs-bench-")
+    # Keep the loader benchmark from polluting the real embedding cache
+    os.environ.setdefault("GABS_EMBEDDING_CACHE_DIR", os.path.join(workdir, "embedding_cache"))
+
+    from benchmarks import igdb_stub, load_generator, microbenchmarks, synthetic_catalog
+    from cache.cache import INDEX_VERSION_REFRESH_SECONDS, bump_index_version
+    from config.projection import VECTOR_DIM
+    from config.storage import VECTOR_TYPE
+
+    results = {"config": {"books": args.books, "games": args.games, "concurrency": args.concurrency,
+                          "vector_dim": VECTOR_DIM, "vector_type": VECTOR_TYPE}}
+    results["conversions"] = microbenchmarks.bench_embedding_conversions()
+    if not args.skip_http:
+        inputs = synthetic_catalog.load_synthetic_catalog(args.books, args.games)
+        if args.query_mode in ("uncached", "both"):
+            # Start from a cold result cache; the app re-reads the index version within the refresh interval
+            bump_index_version()
+            time.sleep(INDEX_VERSION_REFRESH_SECONDS)
+            results["http_uncached"] = load_generator.run_all(args.base_url, inputs, args.concurrency, args.duration,
+                                                              query_mode=load_generator.QUERY_UNCACHED)
+        if args.query_mode in ("cached", "both"):
+            results["http"] = load_generator.run_all(args.base_url, inputs, args.concurrency, args.duration)
+    if not args.skip_loaders:
+        results["loaders"] = microbenchmarks.bench_loaders(args.loader_books, args.loader_games, workdir)
+    if not args.skip_igdb:
+        results["igdb_fetch"] = igdb_stub.bench_igdb_fetch(args.igdb_games, workdir)
+    if args.postgres_url:
+        results["postgres_loader"] = microbenchmarks.bench_postgres_loader(args.loader_games, workdir, args.postgres_url)
+
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print("No baseline to compare against; run with --save-baseline first.")
+        return 0
+    with open(args.baseline, 'r', encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("config") != results["config"]:
+        print("Warning: the baseline was recorded with a different configuration.")
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for metric, before, after in regressions:
+        print(f"REGRESSION {metric}: {before} -> {after}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Import time and memory of the serving entry points.
+
+Each module is imported in a fresh interpreter, which reports the wall-clock import time, its peak RSS and whether
+sentence_transformers/torch were loaded. Run it on two commits to compare them.
+
+Usage: python -m benchmarks.startup_profile [module ...]   (defaults to main and asgi_app)
+"""
+import json
+import subprocess
+import sys
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+__import__({module!r})
+elapsed = time.perf_counter() - started
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_seconds": round(elapsed, 3),
+    "peak_rss_mb": round(peak_kb / 1024 / (1024 if sys.platform == "darwin" else 1), 1),
+    "model_libraries_loaded": any(name in sys.modules for name in ("sentence_transformers", "torch")),
+}}))
+"""
+
+
+def profile(module):
+    completed = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(modules):
+    for module in modules:
+        print(module, profile(module))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or ["main", "asgi_app"])
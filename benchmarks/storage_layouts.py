@@ -0,0 +1,131 @@
+"""
+Memory and latency comparison of the JSON and HASH storage layouts.
+
+Loads the same synthetic book catalog under two throwaway prefixes (one per layout), indexes both with the schema the
+app uses for that layout, then reports per-document memory, index size and the latency of the recommendation read
+path (fetch the seed embedding + KNN query) for each layout.
+
+Usage: python -m benchmarks.storage_layouts [num_docs] [num_queries]
+"""
+import statistics
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from redis.commands.search.query import Query
+
+from books_vector_redis_demo import books_index_schema
+from cache.redis_utils import get_redis_client, get_binary_redis_client
+from config.projection import VECTOR_DIM
+from config.storage import LAYOUT_JSON, LAYOUT_HASH, to_hash_mapping, embedding_to_blob
+
+# Load environment variables
+load_dotenv()
+
+r = get_redis_client()
+r_binary = get_binary_redis_client()
+
+
+def synthetic_books(num_docs, seed=42):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((num_docs, VECTOR_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    for i in range(num_docs):
+        yield {
+            "id": str(i),
+            "title": f"Synthetic Book {i}",
+            "author": f"Author {i % 97}",
+            "status": "published",
+            "year_published": 1950 + i % 70,
+            "description": "A synthetic description used for storage layout benchmarking. " * 4,
+        }, vectors[i]
+
+
+def load(layout, prefix, num_docs):
+    pipe = r.pipeline(transaction=False)
+    for i, (book, vector) in enumerate(synthetic_books(num_docs)):
+        key = f"{prefix}{book['id']}"
+        if layout == LAYOUT_HASH:
+            pipe.hset(key, mapping=to_hash_mapping(book, vector))
+        else:
+            book["embedding"] = vector.tolist()
+            pipe.json().set(key, "$", book)
+        if i % 500 == 499:
+            pipe.execute()
+    pipe.execute()
+
+
+def wait_for_indexing(index_name):
+    while float(r.ft(index_name).info().get("percent_indexed", 1)) < 1:
+        time.sleep(0.2)
+
+
+def memory_per_doc(prefix, num_docs, samples=200):
+    sizes = [r.memory_usage(f"{prefix}{i}", samples=0) or 0 for i in range(0, num_docs, max(1, num_docs // samples))]
+    return statistics.mean(sizes)
+
+
+def read_path_latency(layout, prefix, index_name, num_docs, num_queries):
+    rng = np.random.default_rng(7)
+    query = Query("*=>[KNN 5 @embedding $vec AS score]").return_fields("title", "score").sort_by("score").dialect(2)
+    fetch_ms = []
+    total_ms = []
+    for book_id in rng.integers(0, num_docs, num_queries):
+        key = f"{prefix}{book_id}"
+        started = time.perf_counter()
+        if layout == LAYOUT_HASH:
+            blob = r_binary.hget(key, "embedding")
+        else:
+            blob = embedding_to_blob(r.json().get(key, "$.embedding"))
+        fetched = time.perf_counter()
+        r.ft(index_name).search(query, query_params={"vec": blob})
+        done = time.perf_counter()
+        fetch_ms.append((fetched - started) * 1000)
+        total_ms.append((done - started) * 1000)
+    return fetch_ms, total_ms
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct))
+
+
+def main(num_docs=5000, num_queries=500):
+    rows = []
+    for layout in (LAYOUT_JSON, LAYOUT_HASH):
+        prefix = f"bench_{layout}:book:"
+        index_name = f"bench_{layout}_books_idx"
+        if index_name in r.execute_command("FT._LIST"):
+            r.ft(index_name).dropindex(delete_documents=True)
+
+        schema, index_def = books_index_schema(layout, prefix=prefix)
+        r.ft(index_name).create_index(fields=schema, definition=index_def)
+
+        started = time.perf_counter()
+        load(layout, prefix, num_docs)
+        wait_for_indexing(index_name)
+        load_seconds = time.perf_counter() - started
+
+        info = r.ft(index_name).info()
+        fetch_ms, total_ms = read_path_latency(layout, prefix, index_name, num_docs, num_queries)
+        rows.append({
+            "layout": layout,
+            "bytes/doc": round(memory_per_doc(prefix, num_docs)),
+            "vector index MB": info.get("vector_index_sz_mb"),
+            "load+index s": round(load_seconds, 2),
+            "fetch p50 ms": round(percentile(fetch_ms, 50), 3),
+            "fetch p99 ms": round(percentile(fetch_ms, 99), 3),
+            "fetch+KNN p50 ms": round(percentile(total_ms, 50), 3),
+            "fetch+KNN p99 ms": round(percentile(total_ms, 99), 3),
+        })
+        r.ft(index_name).dropindex(delete_documents=True)
+
+    headers = list(rows[0].keys())
+    print(" | ".join(headers))
+    for row in rows:
+        print(" | ".join(str(row[header]) for header in headers))
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,127 @@
+"""
+Synthetic books and games for the benchmark suite.
+
+The catalog is either written to disk in the loaders' input formats (to benchmark the loaders themselves) or loaded
+straight into Redis with random unit vectors under the real book:/game: prefixes, with the app's indexes, so the HTTP
+endpoints can be driven without running the model. The vectors have the configured GABS_VECTOR_DIM, so they match
+the indexes whatever GABS_VECTOR_DIM and GABS_VECTOR_TYPE are set to. Only point it at a throwaway local Redis Stack.
+"""
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from books_vector_redis_demo import create_books_index, auto_create_special_gabs_cross_model_game_book_index
+from cache.redis_utils import get_redis_client
+from config.index_names import BOOKS_INDEX, GAMES_INDEX, UNIFIED_INDEX
+from config.projection import VECTOR_DIM
+from config.storage import STORAGE_LAYOUT, LAYOUT_HASH, DOC_TYPE_BOOK, to_hash_mapping
+from vectorize_igdb_in_redis_as_json import build_game_document, create_games_index, write_game
+
+WORDS = ("dragon wizard castle quest shadow empire galaxy robot knight forest ocean city mystery ancient war love "
+         "storm island hero magic secret journey crystal machine kingdom star rebel ghost desert frontier").split()
+AUTHORS = [f"Author {i}" for i in range(200)]
+
+r = get_redis_client()
+
+
+def _sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def synthetic_books(num_books, seed=42):
+    rng = random.Random(seed)
+    return [{
+        "id": str(100000 + i),
+        "title": " ".join(rng.choice(WORDS).capitalize() for _ in range(3)),
+        "author": rng.choice(AUTHORS),
+        "status": rng.choice(["published", "draft"]),
+        "year_published": rng.randint(1900, 2024),
+        "description": " ".join(_sentence(rng, 12) for _ in range(4)),
+    } for i in range(num_books)]
+
+
+def synthetic_games(num_games, seed=7):
+    rng = random.Random(seed)
+    games = []
+    for i in range(num_games):
+        name = " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 4)))
+        games.append({
+            "id": 500000 + i,
+            "name": name,
+            "slug": f"{name.lower().replace(' ', '-')}-{i}",
+            "summary": " ".join(_sentence(rng, 15) for _ in range(3)),
+            "storyline": _sentence(rng, 20) if rng.random() < 0.5 else "",
+            "url": f"https://www.igdb.com/games/synthetic-{i}",
+            "category": rng.randint(0, 5),
+            "cover": rng.randint(1, 100000),
+            "first_release_date": rng.randint(315532800, 1700000000),
+        })
+    return games
+
+
+def write_catalog_files(directory, num_books, num_games):
+    """Write the catalog in the loaders' input formats; returns (books directory, games JSON file)."""
+    books_dir = os.path.join(directory, "books")
+    os.makedirs(books_dir, exist_ok=True)
+    for book in synthetic_books(num_books):
+        with open(os.path.join(books_dir, f"{book['id']}.json"), 'w', encoding="utf-8") as book_file:
+            json.dump(book, book_file)
+    games_file = os.path.join(directory, "games_list.json")
+    with open(games_file, 'w', encoding="utf-8") as file:
+        json.dump(synthetic_games(num_games), file)
+    return books_dir, games_file
+
+
+def _random_unit_vectors(count, seed):
+    vectors = np.random.default_rng(seed).standard_normal((count, VECTOR_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def wait_for_indexing(index_name, timeout=600):
+    deadline = time.monotonic() + timeout
+    while float(r.ft(index_name).info().get("percent_indexed", 1)) < 1 and time.monotonic() < deadline:
+        time.sleep(0.5)
+
+
+def load_synthetic_catalog(num_books, num_games, layout=STORAGE_LAYOUT):
+    """
+    Load the catalog into Redis with random vectors and build the app's indexes.
+    Returns the query inputs for the load generator: book IDs, tag queries and game name prefixes, plus for the
+    uncached mode pools of distinct tag queries and game name prefixes as large as the catalog allows.
+    """
+    books = synthetic_books(num_books)
+    games = synthetic_games(num_games)
+    pipe = r.pipeline(transaction=False)
+    for i, (book, vector) in enumerate(zip(books, _random_unit_vectors(num_books, 1))):
+        book = {**book, "doc_type": DOC_TYPE_BOOK}
+        if layout == LAYOUT_HASH:
+            pipe.hset(f"book:{book['id']}", mapping=to_hash_mapping(book, vector))
+        else:
+            book["embedding"] = vector.tolist()
+            pipe.json().set(f"book:{book['id']}", "$", book)
+        if i % 500 == 499:
+            pipe.execute()
+    for i, (game, vector) in enumerate(zip(games, _random_unit_vectors(num_games, 2))):
+        write_game(pipe, build_game_document(game, vector), layout)
+        if i % 500 == 499:
+            pipe.execute()
+    pipe.execute()
+
+    create_books_index(layout)
+    create_games_index(layout)
+    auto_create_special_gabs_cross_model_game_book_index(layout)
+    for index_name in (BOOKS_INDEX, GAMES_INDEX, UNIFIED_INDEX):
+        wait_for_indexing(index_name)
+
+    escaped_authors = [author.replace(" ", "\\ ") for author in AUTHORS]
+    return {
+        "book_ids": [book["id"] for book in books],
+        "tags": [f"@author:{{{author}}}" for author in escaped_authors[:50]] + WORDS,
+        "game_names": sorted({game["name"].split()[0][:4] for game in games}),
+        "unique_tags": [f"@author:{{{author}}} {word}" for author in escaped_authors for word in WORDS],
+        "unique_game_names": sorted({game["name"][:length].strip() for game in games
+                                     for length in range(3, len(game["name"]) + 1)}),
+    }
@@ -1,8 +1,57 @@
-import redis
+import asyncio
+import hashlib
+import json
 import os
+import time
+import uuid
 from datetime import timedelta
 
-r = redis.Redis.from_url(os.getenv("GABS_REDIS_URL"))
+from dotenv import load_dotenv
+
+from cache.redis_utils import get_binary_redis_client
+from config.logger_config import setup_logger
+from config.metrics_config import CACHE_HITS, CACHE_MISSES, HITS, LATENCY
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+r = get_binary_redis_client()
+
+# Result cache TTLs in seconds, per endpoint. Override with e.g. GABS_CACHE_TTL_SEARCH_BOOKS=30
+DEFAULT_RESULT_CACHE_TTLS = {
+    'search_books': 60,
+    'search_games': 60,
+    'recommend_books': 300,
+    'recommend_games': 300,
+    'recommend_books_batch': 300,
+    'semantic_search': 60,
+}
+RESULT_CACHE_TTLS = {endpoint: int(os.getenv(f"GABS_CACHE_TTL_{endpoint.upper()}", ttl))
+                     for endpoint, ttl in DEFAULT_RESULT_CACHE_TTLS.items()}
+
+# Single-flight: how long the recomputing worker holds the lock, and how long the others wait for its result
+LOCK_TIMEOUT_SECONDS = float(os.getenv("GABS_CACHE_LOCK_TIMEOUT", 10))
+LOCK_WAIT_SECONDS = float(os.getenv("GABS_CACHE_LOCK_WAIT", 5))
+LOCK_POLL_SECONDS = 0.05
+
+# Every result key embeds the current index version, so bumping it invalidates all cached results at once
+INDEX_VERSION_KEY = "cache:index_version"
+INDEX_VERSION_REFRESH_SECONDS = 1.0
+
+_index_version = None
+_index_version_read_at = 0.0
+
+# Delete the lock only if we still own it, so a slow worker never releases a lock taken over by another one
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_lock = r.register_script(RELEASE_LOCK_SCRIPT)
 
 
 def get_redis_object():
@@ -20,3 +69,151 @@ def get_cached_data(key):
 def search_in_cache(index, query):
     # Assuming RedisSearch is configured and an index is created
     return r.ft(index).search(query)
+
+
+def normalize_query(query):
+    """Normalize a query so that equivalent inputs share a cache entry."""
+    return " ".join(str(query).split()).lower()
+
+
+def _index_version_is_stale():
+    return _index_version is None or time.monotonic() - _index_version_read_at > INDEX_VERSION_REFRESH_SECONDS
+
+
+def _set_index_version(version):
+    global _index_version, _index_version_read_at
+    _index_version = int(version) if version else 0
+    _index_version_read_at = time.monotonic()
+
+
+def get_index_version():
+    """Return the current index version, re-reading it from Redis at most once per refresh interval."""
+    if _index_version_is_stale():
+        _set_index_version(r.get(INDEX_VERSION_KEY))
+    return _index_version
+
+
+async def get_index_version_async(client):
+    """redis.asyncio counterpart of get_index_version."""
+    if _index_version_is_stale():
+        _set_index_version(await client.get(INDEX_VERSION_KEY))
+    return _index_version
+
+
+def bump_index_version():
+    """Invalidate every cached result. Call this once a reindex has finished."""
+    global _index_version
+    _index_version = r.incr(INDEX_VERSION_KEY)
+    logger.info(f"Result cache invalidated, index version is now {_index_version}")
+    return _index_version
+
+
+def result_cache_key(endpoint, query, version=None):
+    digest = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+    if version is None:
+        version = get_index_version()
+    return f"cache:result:v{version}:{endpoint}:{digest}"
+
+
+def _cache_hit(cached, started):
+    CACHE_HITS.inc()
+    HITS.labels('cache').inc()
+    result = json.loads(cached)
+    LATENCY.labels('cache').observe(time.perf_counter() - started)
+    return result
+
+
+def _db_hit(result, started):
+    HITS.labels('db').inc()
+    LATENCY.labels('db').observe(time.perf_counter() - started)
+    return result
+
+
+def _lock(key):
+    """Return (lock key, fresh owner token, SET arguments taking the lock) for the single-flight lock of key."""
+    token = uuid.uuid4().hex
+    return f"{key}:lock", token, {"nx": True, "px": int(LOCK_TIMEOUT_SECONDS * 1000)}
+
+
+def _cache_entry(endpoint, result, ttl, cache_empty):
+    """Return the (TTL, serialized value) to cache result under, or None when it should not be cached."""
+    if not result and not cache_empty:
+        return None
+    return timedelta(seconds=ttl or RESULT_CACHE_TTLS.get(endpoint, 60)), json.dumps(result)
+
+
+def _gave_up_waiting(key):
+    logger.info(f"Result cache: gave up waiting for {key}, computing it directly")
+
+
+def cached_result(endpoint, query, compute, ttl=None, cache_empty=False):
+    """
+    Return compute() for (endpoint, query) through the result cache.
+
+    On a miss only the worker that wins the per-key lock recomputes; the others poll for its result for up to
+    LOCK_WAIT_SECONDS and only then fall back to computing it themselves. Empty results are not cached by default,
+    since the search functions report errors as empty lists.
+    """
+    started = time.perf_counter()
+    key = result_cache_key(endpoint, query)
+    cached = r.get(key)
+    if cached is not None:
+        return _cache_hit(cached, started)
+    CACHE_MISSES.inc()
+
+    lock_key, token, lock_args = _lock(key)
+    if r.set(lock_key, token, **lock_args):
+        try:
+            result = _db_hit(compute(), started)
+            entry = _cache_entry(endpoint, result, ttl, cache_empty)
+            if entry:
+                r.setex(key, *entry)
+            return result
+        finally:
+            _release_lock(keys=[lock_key], args=[token])
+
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_SECONDS)
+        cached = r.get(key)
+        if cached is not None:
+            return _cache_hit(cached, started)
+        if not r.exists(lock_key):
+            # The winner finished without caching (empty result) or died; stop waiting
+            break
+
+    _gave_up_waiting(key)
+    return _db_hit(compute(), started)
+
+
+async def async_cached_result(client, endpoint, query, compute, ttl=None, cache_empty=False):
+    """redis.asyncio counterpart of cached_result; compute is a coroutine function."""
+    started = time.perf_counter()
+    key = result_cache_key(endpoint, query, await get_index_version_async(client))
+    cached = await client.get(key)
+    if cached is not None:
+        return _cache_hit(cached, started)
+    CACHE_MISSES.inc()
+
+    lock_key, token, lock_args = _lock(key)
+    if await client.set(lock_key, token, **lock_args):
+        try:
+            result = _db_hit(await compute(), started)
+            entry = _cache_entry(endpoint, result, ttl, cache_empty)
+            if entry:
+                await client.setex(key, *entry)
+            return result
+        finally:
+            await client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_SECONDS)
+        cached = await client.get(key)
+        if cached is not None:
+            return _cache_hit(cached, started)
+        if not await client.exists(lock_key):
+            break
+
+    _gave_up_waiting(key)
+    return _db_hit(await compute(), started)
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from config.logger_config import setup_logger
+from config.model_provider import MODEL_NAME, get_model
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+# Set GABS_EMBEDDING_CACHE_DIR to an empty string to disable the cache entirely
+EMBEDDING_CACHE_DIR = os.getenv('GABS_EMBEDDING_CACHE_DIR', "./data/embedding_cache")
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.txt"
+META_FILE = "meta.txt"
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class EmbeddingStore:
+    """
+    Content-addressed, append-only on-disk store of float32 embeddings.
+
+    Vectors live in a raw float32 matrix (one row per embedding) that is read through np.memmap, and a text index
+    maps sha256(model name, text) to a row number. Rows are written and fsynced before their index entries, so a
+    crash can at worst leave unreferenced rows behind, never an index entry pointing at a missing or partial row.
+    Opening the store truncates a torn trailing row or index line, so later appends stay aligned.
+    """
+
+    def __init__(self, directory, model_name):
+        self.model_name = model_name
+        self.directory = os.path.join(directory, re.sub(r'[^A-Za-z0-9_.-]', '_', model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, VECTORS_FILE)
+        self.index_path = os.path.join(self.directory, INDEX_FILE)
+        self.meta_path = os.path.join(self.directory, META_FILE)
+        self.dim = None
+        self.rows = 0
+        self.offsets = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key_for(model_name, text):
+        """Content hash of the (model name, text) pair."""
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if os.path.isfile(self.meta_path):
+            with open(self.meta_path, 'r', encoding="utf-8") as meta_file:
+                self.dim = int(meta_file.read().strip())
+        if self.dim is None or not os.path.isfile(self.vectors_path):
+            return
+
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        self.rows = os.path.getsize(self.vectors_path) // row_bytes
+        if os.path.getsize(self.vectors_path) != self.rows * row_bytes:
+            # A crash mid-write left a partial row: drop it, or the next append would start at a misaligned offset
+            logger.warning(f"Truncating a torn trailing row of {self.vectors_path}")
+            os.truncate(self.vectors_path, self.rows * row_bytes)
+        if os.path.isfile(self.index_path):
+            self._truncate_torn_index_line()
+            with open(self.index_path, 'r', encoding="utf-8") as index_file:
+                for line in index_file:
+                    parts = line.split()
+                    # Skip a torn last line or entries for rows that never made it to disk
+                    if len(parts) == 2 and int(parts[1]) < self.rows:
+                        self.offsets[parts[0]] = int(parts[1])
+        logger.info(f"Embedding store {self.directory} opened with {len(self.offsets)} cached embeddings")
+
+    def _truncate_torn_index_line(self):
+        """Drop a last index line without its newline, so the next entry does not get appended onto it."""
+        with open(self.index_path, 'rb') as index_file:
+            content = index_file.read()
+        if content and not content.endswith(b"\n"):
+            logger.warning(f"Truncating a torn trailing line of {self.index_path}")
+            os.truncate(self.index_path, content.rfind(b"\n") + 1)
+
+    def _get_matrix(self):
+        if self._matrix is None or self._matrix.shape[0] < self.rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self.rows, self.dim))
+        return self._matrix
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, text):
+        """Return the cached embedding for text, or None."""
+        row = self.offsets.get(self.key_for(self.model_name, text))
+        if row is None:
+            return None
+        return np.array(self._get_matrix()[row])
+
+    def put_many(self, texts, vectors):
+        """Append embeddings for texts that are not cached yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, 'w', encoding="utf-8") as meta_file:
+                    meta_file.write(str(self.dim))
+
+            new_keys = {}
+            for text, vector in zip(texts, vectors):
+                key = self.key_for(self.model_name, text)
+                if key not in self.offsets and key not in new_keys:
+                    new_keys[key] = vector
+            new_rows = list(new_keys.values())
+            if not new_keys:
+                return
+
+            with open(self.vectors_path, 'ab') as vectors_file:
+                vectors_file.write(np.stack(new_rows).astype(np.float32).tobytes())
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+            # Only index rows that are durably on disk
+            with open(self.index_path, 'a', encoding="utf-8") as index_file:
+                for i, key in enumerate(new_keys):
+                    index_file.write(f"{key} {self.rows + i}\n")
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            for i, key in enumerate(new_keys):
+                self.offsets[key] = self.rows + i
+            self.rows += len(new_keys)
+
+    def encode(self, texts, model_provider, batch_size=32):
+        """
+        Return a float32 matrix of embeddings for texts, encoding only the texts that are not cached.
+        model_provider is a zero-argument callable returning the model, so a fully cached batch never loads it.
+        """
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        keys = [self.key_for(self.model_name, text) for text in texts]
+        cached = [i for i, key in enumerate(keys) if key in self.offsets]
+        missing = [i for i, key in enumerate(keys) if key not in self.offsets]
+
+        encoded = None
+        if missing:
+            # Encode each distinct missing text once, even if it repeats within the batch
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            unique_encoded = model_provider().encode(unique_texts, batch_size=batch_size,
+                                                     convert_to_numpy=True).astype(np.float32)
+            self.put_many(unique_texts, unique_encoded)
+            positions = {text: i for i, text in enumerate(unique_texts)}
+            encoded = unique_encoded[[positions[texts[i]] for i in missing]]
+
+        result = np.empty((len(texts), self.dim), dtype=np.float32)
+        if cached:
+            matrix = self._get_matrix()
+            for i in cached:
+                result[i] = matrix[self.offsets[keys[i]]]
+        if missing:
+            result[missing] = encoded
+        return result
+
+
+def get_embedding_store(model_name, directory=EMBEDDING_CACHE_DIR):
+    """Return the process-wide store for model_name, or None when the cache is disabled."""
+    if not directory:
+        return None
+    with _stores_lock:
+        key = (os.path.abspath(directory), model_name)
+        if key not in _stores:
+            _stores[key] = EmbeddingStore(directory, model_name)
+        return _stores[key]
+
+
+def encode_texts(texts, model_name=MODEL_NAME, batch_size=32):
+    """Encode texts through the shared embedding store, falling back to plain encoding when it is disabled."""
+    store = get_embedding_store(model_name)
+    if store is None:
+        return get_model(model_name).encode(texts, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+    return store.encode(texts, lambda: get_model(model_name), batch_size=batch_size)
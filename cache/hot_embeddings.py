@@ -0,0 +1,199 @@
+"""
+Process-local LRU of decoded embedding blobs, kept coherent with Redis client-side caching.
+
+A small set of popular books takes most of the recommendation traffic, so each worker keeps their blobs in memory and
+skips the Redis round trip (and the JSON decode) for them. Coherence comes from CLIENT TRACKING in broadcasting mode:
+a dedicated connection tracks the book: and game: prefixes and redirects every invalidation to a second connection
+subscribed to __redis__:invalidate, which evicts the written keys. Whenever those connections are down the cache is
+emptied and bypassed, so a missed invalidation can never serve a stale vector.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from dotenv import load_dotenv
+
+from cache.redis_utils import REDIS_URL, REDIS_SOCKET_CONNECT_TIMEOUT
+from config.logger_config import setup_logger
+from config.metrics_config import HOT_EMBEDDING_CACHE, HOT_EMBEDDING_INVALIDATIONS, HOT_EMBEDDING_CACHE_ENTRIES
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+# Set GABS_HOT_EMBEDDING_CACHE_SIZE to 0 to disable the cache
+HOT_EMBEDDING_CACHE_SIZE = int(os.getenv('GABS_HOT_EMBEDDING_CACHE_SIZE', 10000))
+HOT_EMBEDDING_PREFIXES = ("book:", "game:")
+INVALIDATION_CHANNEL = "__redis__:invalidate"
+# The tracking connection is pinged this often: if it dies, Redis silently stops sending invalidations
+TRACKING_HEALTH_CHECK_SECONDS = 5
+RECONNECT_BACKOFF_SECONDS = 1
+
+
+class HotEmbeddingCache:
+    """
+    Size-bounded LRU of embedding blobs by document key.
+
+    Entries are only trusted while the invalidation listener is connected. A fetch records the generation before
+    going to Redis and its result is only stored if no invalidation arrived in between, so a write racing the fetch
+    cannot leave a stale entry behind. The listener thread starts on first use, so forking servers start it in each
+    worker rather than in the parent.
+    """
+
+    def __init__(self, max_size=HOT_EMBEDDING_CACHE_SIZE, prefixes=HOT_EMBEDDING_PREFIXES, url=REDIS_URL):
+        self.max_size = max_size
+        self.prefixes = prefixes
+        self.url = url
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._connected = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        HOT_EMBEDDING_CACHE_ENTRIES.set_function(lambda: len(self._entries))
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="hot-embedding-invalidation",
+                                                    daemon=True)
+                    self._thread.start()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        """Return the cached blob of key, or None on a miss or while invalidations are not being received."""
+        self._ensure_started()
+        if not self._connected.is_set():
+            HOT_EMBEDDING_CACHE.labels('bypass').inc()
+            return None
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+        HOT_EMBEDDING_CACHE.labels('hit' if blob is not None else 'miss').inc()
+        return blob
+
+    def put(self, key, blob, generation):
+        """Cache blob, fetched after `generation` was read, unless anything was invalidated since."""
+        if not self._connected.is_set():
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = blob
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys=None):
+        """Evict keys, or everything when keys is None (FLUSHDB, or the listener reconnecting)."""
+        with self._lock:
+            self._generation += 1
+            if keys is None:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+        HOT_EMBEDDING_INVALIDATIONS.inc(len(keys) if keys is not None else 1)
+
+    def _connect(self, pool):
+        """Subscribe a listener connection and point broadcast tracking at it. Returns (listener, tracker)."""
+        listener = pool.make_connection()
+        tracker = pool.make_connection()
+        listener.send_command("CLIENT", "ID")
+        listener_id = listener.read_response()
+        listener.send_command("SUBSCRIBE", INVALIDATION_CHANNEL)
+        listener.read_response()
+        prefix_args = [arg for prefix in self.prefixes for arg in ("PREFIX", prefix)]
+        tracker.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", listener_id, "BCAST", *prefix_args)
+        tracker.read_response()
+        return listener, tracker
+
+    def _listen(self, listener, tracker):
+        last_ping = time.monotonic()
+        while True:
+            if listener.can_read(timeout=1):
+                message = listener.read_response()
+                if isinstance(message, list) and len(message) == 3 and message[0] == "message":
+                    self.invalidate(message[2])
+            if time.monotonic() - last_ping > TRACKING_HEALTH_CHECK_SECONDS:
+                tracker.send_command("PING")
+                tracker.read_response()
+                last_ping = time.monotonic()
+
+    def _run(self):
+        pool = redis.ConnectionPool.from_url(self.url, decode_responses=True,
+                                             socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+                                             socket_keepalive=True)
+        while True:
+            listener = tracker = None
+            try:
+                listener, tracker = self._connect(pool)
+                # Anything cached before tracking was (re)established may have missed its invalidation
+                self.invalidate()
+                self._connected.set()
+                logger.info(f"Hot embedding cache tracking {', '.join(self.prefixes)} for invalidations")
+                self._listen(listener, tracker)
+            except Exception as e:
+                logger.warning(f"Hot embedding cache lost its invalidation stream, bypassing it: {e}")
+            finally:
+                self._connected.clear()
+                self.invalidate()
+                for connection in (listener, tracker):
+                    if connection is not None:
+                        connection.disconnect()
+            time.sleep(RECONNECT_BACKOFF_SECONDS)
+
+
+_hot_embedding_cache = None
+_hot_embedding_cache_lock = threading.Lock()
+
+
+def get_hot_embedding_cache():
+    """Return the process-wide HotEmbeddingCache, or None when GABS_HOT_EMBEDDING_CACHE_SIZE is 0."""
+    global _hot_embedding_cache
+    if HOT_EMBEDDING_CACHE_SIZE <= 0:
+        return None
+    if _hot_embedding_cache is None:
+        with _hot_embedding_cache_lock:
+            if _hot_embedding_cache is None:
+                _hot_embedding_cache = HotEmbeddingCache()
+    return _hot_embedding_cache
+
+
+def cached_embedding_blob(key, fetch):
+    """Return the embedding blob of key from the hot cache, or from fetch() (cached when it finds one)."""
+    cache = get_hot_embedding_cache()
+    if cache is None:
+        return fetch()
+    blob = cache.get(key)
+    if blob is not None:
+        return blob
+    generation = cache.generation
+    blob = fetch()
+    if blob:
+        cache.put(key, blob, generation)
+    return blob
+
+
+async def async_cached_embedding_blob(key, fetch):
+    """redis.asyncio counterpart of cached_embedding_blob; fetch is a coroutine function."""
+    cache = get_hot_embedding_cache()
+    if cache is None:
+        return await fetch()
+    blob = cache.get(key)
+    if blob is not None:
+        return blob
+    generation = cache.generation
+    blob = await fetch()
+    if blob:
+        cache.put(key, blob, generation)
+    return blob
@@ -0,0 +1,123 @@
+import json
+
+from cache.cache import get_redis_object
+from config.instrumentation import timed, STAGE_REDIS, STAGE_DECODE
+
+# Precomputed neighbor tables, written by precompute_neighbors.py. Each table is stored packed, as the JSON list the
+# endpoint returns, so serving a recommendation is a single GET. Next to it go the IDs it lists, and for every listed
+# document the set of books whose table lists it, so a changed document can find the tables that went stale.
+BOOK_NEIGHBORS = "books"
+GAME_NEIGHBORS = "games"
+NEIGHBORS_PREFIX = "neighbors"
+
+r = get_redis_object()
+
+
+def neighbors_key(kind, book_id):
+    return f"{NEIGHBORS_PREFIX}:{kind}:{book_id}"
+
+
+def neighbor_ids_key(kind, book_id):
+    return f"{NEIGHBORS_PREFIX}:ids:{kind}:{book_id}"
+
+
+def referrers_key(kind, doc_id):
+    """Set of book IDs whose `kind` table lists the document doc_id."""
+    return f"{NEIGHBORS_PREFIX}:refs:{kind}:{doc_id}"
+
+
+def indexed_ids_key(prefix):
+    """
+    Hash of document ID -> content fingerprint (for the "book" or "game" prefix) of the documents accounted for in the
+    neighbor tables.
+    """
+    return f"{NEIGHBORS_PREFIX}:indexed:{prefix}"
+
+
+def changed_ids_key(prefix):
+    """Set of the IDs of the "book" or "game" documents written or deleted since precompute_neighbors.py last ran."""
+    return f"{NEIGHBORS_PREFIX}:changed:{prefix}"
+
+
+def stale_tables_key(kind):
+    """Set of the book IDs whose `kind` table was dropped and has to be recomputed."""
+    return f"{NEIGHBORS_PREFIX}:stale:{kind}"
+
+
+def worst_scores_key(kind):
+    """Sorted set of book ID -> distance of the last entry of its `kind` table (the maximum, 2, if it is not full)."""
+    return f"{NEIGHBORS_PREFIX}:worst:{kind}"
+
+
+def mark_changed(client, prefix, doc_ids):
+    """
+    Send (or queue, when client is a pipeline) the note that the "book" or "game" documents doc_ids were written or
+    deleted, so the next precompute_neighbors.py run only has to look at those.
+    """
+    if doc_ids:
+        client.sadd(changed_ids_key(prefix), *doc_ids)
+
+
+def get_neighbors(kind, book_id):
+    """Return the precomputed neighbor list of book_id, or None if it has no table yet."""
+    with timed(STAGE_REDIS):
+        packed = r.get(neighbors_key(kind, book_id))
+    return unpack_neighbors(packed)
+
+
+def unpack_neighbors(packed):
+    """Decode a packed neighbor table as read from Redis, or None if the book has no table."""
+    if packed is None:
+        return None
+    with timed(STAGE_DECODE):
+        return json.loads(packed)
+
+
+def get_neighbors_many(kind, book_ids):
+    """Return the precomputed neighbor lists of book_ids in one MGET, with None for books without a table."""
+    if not book_ids:
+        return []
+    return [json.loads(packed) if packed is not None else None
+            for packed in r.mget([neighbors_key(kind, book_id) for book_id in book_ids])]
+
+
+def get_neighbor_ids_many(kind, book_ids):
+    """Return the document IDs listed by the tables of book_ids, in table order, with [] for books without a table."""
+    if not book_ids:
+        return []
+    return [json.loads(packed) if packed is not None else []
+            for packed in r.mget([neighbor_ids_key(kind, book_id) for book_id in book_ids])]
+
+
+def put_neighbors(client, kind, book_id, neighbors, neighbor_ids, previous_ids=()):
+    """
+    Send (or queue, when client is a pipeline) the write of the neighbor list of book_id, the document IDs it lists
+    and the reverse references to them. previous_ids are the IDs its former table listed.
+    """
+    client.set(neighbors_key(kind, book_id), json.dumps(neighbors, separators=(",", ":")))
+    client.set(neighbor_ids_key(kind, book_id), json.dumps(neighbor_ids, separators=(",", ":")))
+    for doc_id in set(previous_ids) - set(neighbor_ids):
+        client.srem(referrers_key(kind, doc_id), book_id)
+    for doc_id in set(neighbor_ids) - set(previous_ids):
+        client.sadd(referrers_key(kind, doc_id), book_id)
+
+
+def drop_tables_listing(client, kind, doc_ids):
+    """
+    Delete the `kind` tables that list any of doc_ids, so those books fall back to the live KNN query until
+    precompute_neighbors.py rebuilds them (they are marked stale). Returns the IDs of the books whose table was dropped.
+    """
+    if not doc_ids:
+        return set()
+    pipe = client.pipeline(transaction=False)
+    for doc_id in doc_ids:
+        pipe.smembers(referrers_key(kind, doc_id))
+    book_ids = set().union(*pipe.execute())
+    pipe = client.pipeline(transaction=False)
+    # The IDs keys and reverse references stay, so the rebuild can tell which references its new table replaces
+    for book_id in book_ids:
+        pipe.delete(neighbors_key(kind, book_id))
+    if book_ids:
+        pipe.sadd(stale_tables_key(kind), *book_ids)
+    pipe.execute()
+    return book_ids
@@ -0,0 +1,163 @@
+"""
+Admission control: per-endpoint concurrency limits with a bounded wait queue.
+
+Each endpoint runs at most MAX_CONCURRENCY requests at once per process. Up to MAX_QUEUE more wait for a slot, for at
+most QUEUE_TIMEOUT seconds; anything beyond that is rejected straight away with a 503 and a Retry-After header, so an
+overloaded worker sheds load in microseconds instead of letting every request queue behind the slow ones. Every
+setting can be overridden for one endpoint, e.g. GABS_ADMISSION_SEMANTIC_SEARCH_MAX_CONCURRENCY.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from config.logger_config import setup_logger
+from config.metrics_config import REQUESTS_SHED, ADMISSION_IN_FLIGHT, ADMISSION_QUEUED
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+# Set GABS_ADMISSION_MAX_CONCURRENCY to 0 to disable admission control
+ADMISSION_DEFAULTS = {"MAX_CONCURRENCY": 16, "MAX_QUEUE": 32, "QUEUE_TIMEOUT": 1.0}
+RETRY_AFTER_SECONDS = 1
+
+SHED_QUEUE_FULL = "queue_full"
+SHED_QUEUE_TIMEOUT = "queue_timeout"
+
+
+def admission_setting(endpoint, name):
+    default = os.getenv(f"GABS_ADMISSION_{name}", ADMISSION_DEFAULTS[name])
+    return type(ADMISSION_DEFAULTS[name])(os.getenv(f"GABS_ADMISSION_{endpoint.upper()}_{name}", default))
+
+
+class EndpointLimiter:
+    """
+    Concurrency slots and wait queue of one endpoint. The sync and asyncio entry points keep separate slots: an app
+    only ever uses one of them.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.max_concurrency = admission_setting(endpoint, "MAX_CONCURRENCY")
+        self.max_queue = admission_setting(endpoint, "MAX_QUEUE")
+        self.queue_timeout = admission_setting(endpoint, "QUEUE_TIMEOUT")
+        self._slots = threading.BoundedSemaphore(max(self.max_concurrency, 1))
+        self._async_slots = None
+        self._queued = 0
+        self._lock = threading.Lock()
+        ADMISSION_QUEUED.labels(endpoint).set_function(lambda: self._queued)
+
+    def _enqueue(self):
+        """Take a place in the wait queue. Returns False when it is full."""
+        with self._lock:
+            if self._queued >= self.max_queue:
+                return False
+            self._queued += 1
+            return True
+
+    def _dequeue(self):
+        with self._lock:
+            self._queued -= 1
+
+    def _shed(self, reason):
+        REQUESTS_SHED.labels(self.endpoint, reason).inc()
+        logger.warning(f"Shedding a {self.endpoint} request: {reason}")
+        return reason
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed. Returns None once admitted, or why the request was shed."""
+        if self._slots.acquire(blocking=False):
+            return None
+        if not self._enqueue():
+            return self._shed(SHED_QUEUE_FULL)
+        try:
+            admitted = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            self._dequeue()
+        return None if admitted else self._shed(SHED_QUEUE_TIMEOUT)
+
+    def release(self):
+        self._slots.release()
+
+    async def async_acquire(self):
+        """asyncio counterpart of acquire."""
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(max(self.max_concurrency, 1))
+        if not self._async_slots.locked():
+            await self._async_slots.acquire()
+            return None
+        if not self._enqueue():
+            return self._shed(SHED_QUEUE_FULL)
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return self._shed(SHED_QUEUE_TIMEOUT)
+        finally:
+            self._dequeue()
+        return None
+
+    def async_release(self):
+        self._async_slots.release()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint):
+    with _limiters_lock:
+        limiter = _limiters.get(endpoint)
+        if limiter is None:
+            limiter = _limiters[endpoint] = EndpointLimiter(endpoint)
+        return limiter
+
+
+def overloaded_response(endpoint, reason):
+    """The 503 returned to shed requests; a dict body works in both Flask and Quart."""
+    return {"error": f"{endpoint} is overloaded ({reason}), retry shortly"}, 503, \
+        {"Retry-After": str(RETRY_AFTER_SECONDS)}
+
+
+def admission_controlled(endpoint):
+    """Decorator for sync or async views: runs the view within the endpoint's concurrency limit, or sheds it."""
+
+    def decorator(view):
+        if admission_setting(endpoint, "MAX_CONCURRENCY") <= 0:
+            return view
+        limiter = get_limiter(endpoint)
+        in_flight = ADMISSION_IN_FLIGHT.labels(endpoint)
+
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                reason = await limiter.async_acquire()
+                if reason:
+                    return overloaded_response(endpoint, reason)
+                try:
+                    with in_flight.track_inprogress():
+                        return await view(*args, **kwargs)
+                finally:
+                    limiter.async_release()
+
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            reason = limiter.acquire()
+            if reason:
+                return overloaded_response(endpoint, reason)
+            try:
+                with in_flight.track_inprogress():
+                    return view(*args, **kwargs)
+            finally:
+                limiter.release()
+
+        return wrapper
+
+    return decorator
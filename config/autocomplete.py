@@ -0,0 +1,127 @@
+"""
+Type-ahead for game and book titles.
+
+The loaders add every title to a suggestion dictionary (FT.SUGADD), weighted by popularity and carrying the document
+ID as payload, so completing a prefix is an FT.SUGGET trie lookup instead of a prefix-wildcard FT.SEARCH. The helpers
+below also escape user input before it is spliced into a RediSearch query.
+"""
+import math
+import os
+import re
+
+from dotenv import load_dotenv
+
+from config.logger_config import setup_logger
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+GAME_SUGGESTIONS_KEY = os.getenv('GABS_GAME_SUGGESTIONS_KEY', "sugg:games")
+BOOK_SUGGESTIONS_KEY = os.getenv('GABS_BOOK_SUGGESTIONS_KEY', "sugg:books")
+AUTOCOMPLETE_DEFAULT_MAX = 10
+AUTOCOMPLETE_MAX_RESULTS = int(os.getenv('GABS_AUTOCOMPLETE_MAX_RESULTS', 50))
+# Shorter prefixes match too much of the dictionary to be useful, and FT.SUGGET FUZZY gets expensive on them
+AUTOCOMPLETE_MIN_PREFIX = 2
+
+# Suggestion dictionary and popularity field of each document type
+SUGGESTION_SOURCES = {
+    "games": (GAME_SUGGESTIONS_KEY, "total_rating_count"),
+    "books": (BOOK_SUGGESTIONS_KEY, "ratings_count"),
+}
+
+# Characters with a meaning in the RediSearch query syntax
+QUERY_SPECIAL_CHARS = re.compile(r"([,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\])")
+# RediSearch only expands prefixes of at least this many characters (MINPREFIX)
+QUERY_MIN_PREFIX = 2
+
+
+def escape_query_text(text):
+    """Backslash-escape query syntax in user input, so it is matched literally."""
+    return QUERY_SPECIAL_CHARS.sub(r"\\\1", text)
+
+
+def prefix_query_text(text):
+    """
+    Turn user input into an escaped TEXT query whose last term is matched as a prefix, e.g. 'zelda: bre' becomes
+    'zelda\\: bre*'. Returns None when the input has no terms.
+    """
+    terms = [escape_query_text(term) for term in text.split()]
+    if not terms:
+        return None
+    if len(text.split()[-1]) >= QUERY_MIN_PREFIX:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def suggestion_weight(record, popularity_field):
+    """Popularity weight of a title: logarithmic, so blockbusters rank first without drowning out everything else."""
+    try:
+        popularity = max(float(record.get(popularity_field) or 0), 0.0)
+    except (TypeError, ValueError):
+        popularity = 0.0
+    return 1.0 + math.log1p(popularity)
+
+
+def add_suggestion(client, key, title, weight, payload):
+    """Send (or queue, when client is a pipeline) the FT.SUGADD of one title. An existing title gets the new weight."""
+    if not title:
+        return
+    client.execute_command("FT.SUGADD", key, title, weight, "PAYLOAD", payload)
+
+
+def add_game_suggestion(client, game):
+    key, popularity_field = SUGGESTION_SOURCES["games"]
+    add_suggestion(client, key, game.get('name'), suggestion_weight(game, popularity_field), game['id'])
+
+
+def add_book_suggestion(client, book):
+    key, popularity_field = SUGGESTION_SOURCES["books"]
+    add_suggestion(client, key, book.get('title'), suggestion_weight(book, popularity_field), book['id'])
+
+
+def parse_max_results(max_results):
+    return max(1, min(max_results or AUTOCOMPLETE_DEFAULT_MAX, AUTOCOMPLETE_MAX_RESULTS))
+
+
+def shape_suggestions(suggestions):
+    return [{"name": suggestion.string, "id": suggestion.payload, "score": suggestion.score}
+            for suggestion in suggestions]
+
+
+def suggestion_request(source, prefix, fuzzy=False, max_results=None):
+    """FT.SUGGET arguments completing prefix from the dictionary of source, or None when the prefix is too short."""
+    prefix = prefix.strip()
+    if len(prefix) < AUTOCOMPLETE_MIN_PREFIX:
+        return None
+    return {"key": SUGGESTION_SOURCES[source][0], "prefix": prefix, "fuzzy": fuzzy,
+            "num": parse_max_results(max_results), "with_scores": True, "with_payloads": True}
+
+
+def autocomplete(client, source, prefix, fuzzy=False, max_results=None):
+    """
+    Complete prefix against the suggestion dictionary of source ("games" or "books"), best matches first.
+    fuzzy also matches prefixes one edit away. Returns [{"name", "id", "score"}].
+    """
+    sugget = suggestion_request(source, prefix, fuzzy, max_results)
+    if sugget is None:
+        return []
+    try:
+        return shape_suggestions(client.ft().sugget(**sugget))
+    except Exception as e:
+        logger.error(f"Error completing '{sugget['prefix']}' from {sugget['key']}: {e}")
+        return []
+
+
+async def async_autocomplete(client, source, prefix, fuzzy=False, max_results=None):
+    """redis.asyncio counterpart of autocomplete."""
+    sugget = suggestion_request(source, prefix, fuzzy, max_results)
+    if sugget is None:
+        return []
+    try:
+        return shape_suggestions(await client.ft().sugget(**sugget))
+    except Exception as e:
+        logger.error(f"Error completing '{sugget['prefix']}' from {sugget['key']}: {e}")
+        return []
@@ -0,0 +1,212 @@
+"""
+Sharded NDJSON catalog format.
+
+A catalog is a directory of shards, each holding up to `shard_size` records as one JSON document per line, next to a
+sidecar index of "id<TAB>byte offset" lines, plus a manifest listing the shards and their record counts:
+
+    data/catalog/games/
+        manifest.json
+        shard-00000.ndjson
+        shard-00000.idx
+        ...
+
+Readers stream records one line at a time, so memory stays flat however large the catalog grows, and shards can be
+handed to separate workers. The legacy formats (one JSON array file for games, a directory of one-file-per-book JSON
+for books) are still readable, and can be converted with:
+
+    python -m config.catalog
+"""
+import itertools
+import json
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from config.logger_config import setup_logger
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+CATALOG_SHARD_SIZE = int(os.getenv('GABS_CATALOG_SHARD_SIZE', 50000))
+GAMES_CATALOG_DIR = os.getenv('GABS_GAMES_CATALOG_DIR', "./data/catalog/games")
+BOOKS_CATALOG_DIR = os.getenv('GABS_BOOKS_CATALOG_DIR', "./data/catalog/books")
+# Legacy sources, read when the catalog has not been built
+GAMES_LEGACY_FILE = "./data/games_list.json"
+BOOKS_LEGACY_DIR = "./data/books/"
+MANIFEST_FILE = "manifest.json"
+
+
+def is_catalog(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def resolve_source(catalog_dir, legacy_path):
+    """Prefer the sharded catalog when it has been built, else fall back to the legacy file or directory."""
+    return catalog_dir if is_catalog(catalog_dir) else legacy_path
+
+
+def read_manifest(catalog_dir):
+    with open(os.path.join(catalog_dir, MANIFEST_FILE), 'r', encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _shard_name(number):
+    return f"shard-{number:05d}"
+
+
+def write_catalog(records, catalog_dir, shard_size=CATALOG_SHARD_SIZE, id_field="id"):
+    """
+    Stream records (any iterable of dicts) into a sharded catalog, replacing any catalog already in catalog_dir.
+    Returns the manifest.
+    """
+    os.makedirs(catalog_dir, exist_ok=True)
+    for name in os.listdir(catalog_dir):
+        if name.startswith("shard-"):
+            os.remove(os.path.join(catalog_dir, name))
+
+    shards = []
+    records = iter(records)
+    for number in itertools.count():
+        batch = list(itertools.islice(records, shard_size))
+        if not batch:
+            break
+        name = _shard_name(number)
+        with open(os.path.join(catalog_dir, f"{name}.ndjson"), 'wb') as shard_file, \
+                open(os.path.join(catalog_dir, f"{name}.idx"), 'w', encoding="utf-8") as index_file:
+            for record in batch:
+                index_file.write(f"{record[id_field]}\t{shard_file.tell()}\n")
+                shard_file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+                shard_file.write(b"\n")
+        shards.append({"name": name, "records": len(batch)})
+        logger.info(f"Catalog shard {name} written with {len(batch)} records")
+
+    manifest = {"format": "ndjson", "id_field": id_field, "shard_size": shard_size, "shards": shards,
+                "records": sum(shard["records"] for shard in shards)}
+    # The manifest goes last, so a half-written catalog is never mistaken for a complete one
+    tmp_file = os.path.join(catalog_dir, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_file, 'w', encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_file, os.path.join(catalog_dir, MANIFEST_FILE))
+    _indexes.pop(os.path.abspath(catalog_dir), None)
+    return manifest
+
+
+def list_shards(catalog_dir):
+    """Return the shard file paths of a catalog, e.g. to process them in parallel with iter_shard."""
+    return [os.path.join(catalog_dir, f"{shard['name']}.ndjson") for shard in read_manifest(catalog_dir)["shards"]]
+
+
+def iter_shard(shard_path, start=0):
+    """Yield the records of one shard, skipping the first `start` lines without parsing them."""
+    with open(shard_path, 'rb') as file:
+        for line in itertools.islice(file, start, None):
+            if line.strip():
+                yield json.loads(line)
+
+
+def _iter_legacy(path):
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            filepath = os.path.join(path, filename)
+            if os.path.isfile(filepath):
+                with open(filepath, 'r', encoding="utf-8") as file:
+                    yield json.load(file)
+    else:
+        # A single JSON array has to be parsed as a whole; convert it to a catalog to stream it
+        with open(path, 'r', encoding="utf-8") as file:
+            yield from json.load(file)
+
+
+def iter_records(source, start=0):
+    """
+    Lazily yield the records of source: a sharded catalog, a legacy JSON array file or a legacy directory of JSON
+    files. `start` skips that many records; in a catalog whole shards are skipped by their manifest counts.
+    """
+    if not is_catalog(source):
+        yield from itertools.islice(_iter_legacy(source), start, None)
+        return
+    for shard in read_manifest(source)["shards"]:
+        if start >= shard["records"]:
+            start -= shard["records"]
+            continue
+        yield from iter_shard(os.path.join(source, f"{shard['name']}.ndjson"), start)
+        start = 0
+
+
+def count_records(source):
+    """Number of records in source, read from the manifest for catalogs."""
+    if is_catalog(source):
+        return read_manifest(source)["records"]
+    return sum(1 for _ in _iter_legacy(source))
+
+
+def iter_batches(records, batch_size):
+    """Group an iterable of records into lists of up to batch_size."""
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# id -> (shard path, byte offset), loaded from the sidecar indexes on first lookup
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _load_index(catalog_dir):
+    key = os.path.abspath(catalog_dir)
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = {}
+                for shard_path in list_shards(catalog_dir):
+                    with open(f"{shard_path[:-len('.ndjson')]}.idx", 'r', encoding="utf-8") as index_file:
+                        for line in index_file:
+                            record_id, offset = line.rstrip("\n").split("\t")
+                            index[record_id] = (shard_path, int(offset))
+                _indexes[key] = index
+    return index
+
+
+def get_record(catalog_dir, record_id):
+    """Return the record with the given id through the sidecar index (one seek and one line read), or None."""
+    location = _load_index(catalog_dir).get(str(record_id))
+    if location is None:
+        return None
+    shard_path, offset = location
+    with open(shard_path, 'rb') as file:
+        file.seek(offset)
+        return json.loads(file.readline())
+
+
+def convert_games_file(json_file, catalog_dir=GAMES_CATALOG_DIR, shard_size=CATALOG_SHARD_SIZE):
+    """Convert the legacy games JSON array (e.g. data/games_list.json) into a sharded catalog."""
+    return write_catalog(_iter_legacy(json_file), catalog_dir, shard_size)
+
+
+def convert_books_dir(books_dir, catalog_dir=BOOKS_CATALOG_DIR, shard_size=CATALOG_SHARD_SIZE):
+    """Convert the legacy one-file-per-book directory (e.g. data/books/) into a sharded catalog."""
+    return write_catalog(_iter_legacy(books_dir), catalog_dir, shard_size)
+
+
+def main():
+    games_file = GAMES_LEGACY_FILE
+    books_dir = BOOKS_LEGACY_DIR
+    if os.path.isfile(games_file):
+        manifest = convert_games_file(games_file)
+        logger.info(f"{games_file} converted to {GAMES_CATALOG_DIR}: {manifest['records']} games")
+    if os.path.isdir(books_dir):
+        manifest = convert_books_dir(books_dir)
+        logger.info(f"{books_dir} converted to {BOOKS_CATALOG_DIR}: {manifest['records']} books")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Texts the book and game embeddings are computed from, shared by the loaders, the sync and the PCA projection fit.
+"""
+import itertools
+import os
+
+from config.catalog import GAMES_CATALOG_DIR, BOOKS_CATALOG_DIR, GAMES_LEGACY_FILE, BOOKS_LEGACY_DIR, \
+    resolve_source, iter_records
+from config.projection import PROJECTION_FIT_SAMPLE, ensure_projection
+
+
+def build_book_text(book):
+    """Append the title and author to the description: the text used for the book embedding."""
+    return f"{book['title']} {book['author']} {book['description']}"
+
+
+def build_game_text(game):
+    """Concatenate name, summary, and storyline into the text used for the game embedding."""
+    text_to_embed = game['name']
+    if 'summary' in game:
+        text_to_embed += ' ' + game['summary']
+    if 'storyline' in game and game['storyline'].strip():
+        text_to_embed += ' ' + game['storyline']
+    return text_to_embed
+
+
+def ensure_catalog_projection(books_source=None, games_source=None, sample=PROJECTION_FIT_SAMPLE):
+    """
+    With GABS_VECTOR_DIM set, fit the PCA projection unless one is already stored. It is fitted on up to `sample`
+    texts of each catalog, so books and games shape the reduced space whichever of them is loaded first.
+    """
+    sources = [(books_source or resolve_source(BOOKS_CATALOG_DIR, BOOKS_LEGACY_DIR), build_book_text),
+               (games_source or resolve_source(GAMES_CATALOG_DIR, GAMES_LEGACY_FILE), build_game_text)]
+    # A catalog that has not been fetched yet is left out; fit_projection refuses too small a sample
+    ensure_projection(build_text(record) for source, build_text in sources if os.path.exists(source)
+                      for record in itertools.islice(iter_records(source), sample))
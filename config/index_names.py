@@ -1,3 +1,14 @@
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
 BOOKS_INDEX = "books_idx"
 GAMES_INDEX = "games_idx"
-UNIFIED_INDEX = "unified_idx"
\ No newline at end of file
+UNIFIED_INDEX = "unified_idx"
+
+# unified_idx holds a second HNSW graph over every game and book vector. With it disabled, book -> game
+# recommendations query games_idx with the book's vector instead (both live in the same embedding space).
+UNIFIED_INDEX_ENABLED = os.getenv('GABS_UNIFIED_INDEX', 'true').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,167 @@
+"""
+Versioned indexes behind aliases.
+
+The app only ever queries BOOKS_INDEX, GAMES_INDEX and UNIFIED_INDEX, which are aliases of versioned indexes
+(books_idx_v1, books_idx_v2, ...). A rebuild creates the next version next to the live one, waits for RediSearch to
+backfill it to 100% (FT.INFO percent_indexed), then swaps the alias with FT.ALIASUPDATE and drops the versions that
+are no longer needed. Readers keep hitting the old version until the swap, so a schema change never serves errors.
+
+Indexes created before aliases existed (a plain index named books_idx) are migrated on their first rebuild: the old
+index is dropped and the alias added in one MULTI, so the name never dangles.
+"""
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+from redis.exceptions import ResponseError
+
+from cache.cache import bump_index_version
+from cache.redis_utils import get_redis_client
+from config.logger_config import setup_logger
+from config.metrics_config import INDEX_BUILD_PROGRESS
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+# Previous versions kept after a swap, to roll back with FT.ALIASUPDATE without rebuilding
+INDEX_VERSIONS_KEEP = int(os.getenv('GABS_INDEX_VERSIONS_KEEP', 1))
+INDEX_BUILD_POLL_SECONDS = float(os.getenv('GABS_INDEX_BUILD_POLL_SECONDS', 1))
+INDEX_BUILD_TIMEOUT_SECONDS = float(os.getenv('GABS_INDEX_BUILD_TIMEOUT', 3600))
+
+r = get_redis_client()
+
+# Aliases known to exist, so ensure_index costs nothing after the first call in a process
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def versioned_name(alias, version):
+    return f"{alias}_v{version}"
+
+
+def list_versions(alias):
+    """Return the {version: index name} of every versioned index behind alias."""
+    pattern = re.compile(rf"^{re.escape(alias)}_v(\d+)$")
+    versions = {}
+    for index_name in r.execute_command("FT._LIST"):
+        match = pattern.match(index_name)
+        if match:
+            versions[int(match.group(1))] = index_name
+    return versions
+
+
+def is_legacy_index(alias):
+    """True when alias is still a plain, unversioned index."""
+    return alias in r.execute_command("FT._LIST")
+
+
+def resolve_alias(alias):
+    """Return the index alias points to (alias itself for a legacy index), or None if it does not exist."""
+    try:
+        return r.ft(alias).info()["index_name"]
+    except ResponseError:
+        return None
+
+
+def indexing_progress(index_name):
+    """Fraction of the documents backfilled into index_name, from 0 to 1."""
+    info = r.ft(index_name).info()
+    if int(info.get("indexing", 0)):
+        return min(float(info.get("percent_indexed", 0)), 0.999)
+    return float(info.get("percent_indexed", 1))
+
+
+def wait_until_indexed(alias, index_name, timeout=INDEX_BUILD_TIMEOUT_SECONDS, poll=INDEX_BUILD_POLL_SECONDS):
+    """Block until index_name is fully backfilled, reporting progress under the alias. Raises TimeoutError."""
+    started = time.monotonic()
+    while True:
+        progress = indexing_progress(index_name)
+        INDEX_BUILD_PROGRESS.labels(alias).set(progress)
+        if progress >= 1:
+            logger.info(f"{index_name} fully indexed in {time.monotonic() - started:.1f}s")
+            return
+        if time.monotonic() - started > timeout:
+            raise TimeoutError(f"{index_name} still at {progress:.1%} after {timeout}s")
+        logger.info(f"{index_name} indexing: {progress:.1%}")
+        time.sleep(poll)
+
+
+def swap_alias(alias, index_name):
+    """Point alias at index_name. A legacy index of the same name is dropped (keeping its documents) atomically."""
+    if is_legacy_index(alias):
+        pipe = r.pipeline(transaction=True)
+        pipe.execute_command("FT.DROPINDEX", alias)
+        pipe.execute_command("FT.ALIASADD", alias, index_name)
+        pipe.execute()
+        logger.info(f"Legacy index {alias} replaced by alias {alias} -> {index_name}")
+    else:
+        r.execute_command("FT.ALIASUPDATE", alias, index_name)
+        logger.info(f"Alias {alias} -> {index_name}")
+
+
+def garbage_collect_versions(alias, keep=INDEX_VERSIONS_KEEP):
+    """Drop the versions older than the live one, except the `keep` newest. Documents are never deleted."""
+    live = resolve_alias(alias)
+    versions = list_versions(alias)
+    older = sorted((version for version, index_name in versions.items() if index_name != live), reverse=True)
+    live_version = next((version for version, index_name in versions.items() if index_name == live), None)
+    dropped = []
+    for version in older:
+        # Versions newer than the live one are in-flight or abandoned builds: leave them to the next rebuild
+        if live_version is not None and version > live_version:
+            continue
+        if keep > 0:
+            keep -= 1
+            continue
+        r.execute_command("FT.DROPINDEX", versions[version])
+        dropped.append(versions[version])
+    if dropped:
+        logger.info(f"Dropped old versions of {alias}: {dropped}")
+    return dropped
+
+
+def build_index_version(alias, schema, index_def, timeout=INDEX_BUILD_TIMEOUT_SECONDS):
+    """
+    Build the next version of alias with schema and index_def, swap the alias to it once fully indexed and garbage
+    collect the old versions. Returns the new index name.
+    """
+    versions = list_versions(alias)
+    index_name = versioned_name(alias, max(versions, default=0) + 1)
+    INDEX_BUILD_PROGRESS.labels(alias).set(0)
+    r.ft(index_name).create_index(fields=schema, definition=index_def)
+    logger.info(f"Building {index_name} in the background, {alias} keeps serving {resolve_alias(alias)}")
+    try:
+        wait_until_indexed(alias, index_name, timeout)
+    except Exception:
+        # The half-built version would otherwise linger, and the alias still points at the old one
+        r.execute_command("FT.DROPINDEX", index_name)
+        raise
+    swap_alias(alias, index_name)
+    with _ensured_lock:
+        _ensured.add(alias)
+    # Cached results were computed against the old version
+    bump_index_version()
+    garbage_collect_versions(alias)
+    return index_name
+
+
+def ensure_index(alias, schema, index_def):
+    """Create the first version of alias when neither the alias nor a legacy index of that name exists."""
+    if alias in _ensured:
+        return
+    with _ensured_lock:
+        if alias in _ensured:
+            return
+        if resolve_alias(alias) is not None:
+            logger.info(f"{alias} already exists.")
+        else:
+            index_name = versioned_name(alias, max(list_versions(alias), default=0) + 1)
+            r.ft(index_name).create_index(fields=schema, definition=index_def)
+            r.execute_command("FT.ALIASUPDATE", alias, index_name)
+            logger.info(f"{index_name} created behind alias {alias}.")
+        _ensured.add(alias)
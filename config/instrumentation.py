@@ -0,0 +1,213 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from redis.commands.search.query import Query
+from redis.exceptions import ResponseError
+
+from cache.redis_utils import get_redis_client, get_async_redis_client
+from config.logger_config import setup_logger
+from config.metrics_config import REQUEST_DURATION, SERVICE_LATENCY, STAGE_LATENCY, QUERY_TIMEOUTS
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+# Hot-path stages, used as the `stage` label of stage_latency_seconds
+STAGE_REDIS = "redis_round_trip"
+STAGE_SERVER = "ft_search_server"
+STAGE_DECODE = "decode"
+STAGE_SHAPING = "result_shaping"
+STAGE_SERIALIZATION = "serialization"
+
+# FT.SEARCH calls slower than SLOW_QUERY_MS are logged with probability SLOW_QUERY_SAMPLE_RATE, and a
+# PROFILE_SAMPLE_RATE share of them runs as FT.PROFILE to record the server-side time
+SLOW_QUERY_MS = float(os.getenv('GABS_SLOW_QUERY_MS', 50))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('GABS_SLOW_QUERY_SAMPLE_RATE', 0.1))
+SLOW_QUERY_LOG_KEY = "slowlog:queries"
+SLOW_QUERY_LOG_SIZE = int(os.getenv('GABS_SLOW_QUERY_LOG_SIZE', 1000))
+PROFILE_SAMPLE_RATE = float(os.getenv('GABS_PROFILE_SAMPLE_RATE', 0.01))
+
+# Server-side TIMEOUT of every FT.SEARCH, in milliseconds (0 keeps the server's default). Under the default
+# ON_TIMEOUT RETURN policy a timed-out query returns partial results; set ON_TIMEOUT FAIL to get an error instead.
+SEARCH_TIMEOUT_MS = int(os.getenv('GABS_SEARCH_TIMEOUT_MS', 500))
+
+# The slow-query log is written to the primary: the searches themselves may run on a read-only replica
+r = get_redis_client()
+r_async = get_async_redis_client()
+
+_current_endpoint = contextvars.ContextVar("endpoint", default="none")
+
+
+@contextmanager
+def timed(stage):
+    """Observe the duration of the enclosed block as `stage` of the current endpoint."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(_current_endpoint.get(), stage).observe(time.perf_counter() - started)
+
+
+def instrumented(endpoint):
+    """Decorator for sync or async views: labels the stages timed inside the view and times the whole request."""
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                token = _current_endpoint.set(endpoint)
+                started = time.perf_counter()
+                try:
+                    return await view(*args, **kwargs)
+                finally:
+                    _observe_request(endpoint, time.perf_counter() - started)
+                    _current_endpoint.reset(token)
+
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            token = _current_endpoint.set(endpoint)
+            started = time.perf_counter()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _observe_request(endpoint, time.perf_counter() - started)
+                _current_endpoint.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def _observe_request(endpoint, seconds):
+    REQUEST_DURATION.observe(seconds)
+    SERVICE_LATENCY.labels(endpoint).observe(seconds)
+
+
+def _describe_params(query_params):
+    """Query parameters for the slow-query log, with binary vectors summarized instead of dumped."""
+    return {name: f"<{len(value)} bytes>" if isinstance(value, bytes) else value
+            for name, value in (query_params or {}).items()}
+
+
+def _slow_query_entry(index_name, query, query_params, elapsed_ms):
+    if elapsed_ms < SLOW_QUERY_MS or random.random() >= SLOW_QUERY_SAMPLE_RATE:
+        return None
+    entry = {
+        "ts": time.time(),
+        "endpoint": _current_endpoint.get(),
+        "index": index_name,
+        "query": query.query_string() if isinstance(query, Query) else str(query),
+        "args": [str(arg) for arg in query.get_args()[1:]] if isinstance(query, Query) else [],
+        "params": _describe_params(query_params),
+        "elapsed_ms": round(elapsed_ms, 2),
+    }
+    logger.warning(f"Slow query on {index_name} ({elapsed_ms:.1f} ms): {entry['query']} {entry['params']}")
+    return json.dumps(entry)
+
+
+def _profile_server_seconds(profile):
+    """Extract the total server time (reported in ms) from parsed FT.PROFILE output."""
+    if isinstance(profile, dict):
+        for key, value in profile.items():
+            if "total profile time" in str(key).lower():
+                return float(value) / 1000
+    return None
+
+
+def with_timeout(query):
+    """Give a Query without an explicit TIMEOUT the configured SEARCH_TIMEOUT_MS."""
+    if SEARCH_TIMEOUT_MS > 0 and isinstance(query, Query) and query._timeout is None:
+        query.timeout(SEARCH_TIMEOUT_MS)
+    return query
+
+
+def _is_timeout_error(error):
+    return isinstance(error, ResponseError) and "timeout" in str(error).lower()
+
+
+def _count_timeout(index_name, query, elapsed_ms, error=None):
+    """Count a query that failed on its TIMEOUT, or that ran past it and so returned partial results."""
+    if error is not None:
+        QUERY_TIMEOUTS.labels(_current_endpoint.get(), index_name, "failed").inc()
+        logger.warning(f"Query on {index_name} timed out: {error}")
+    elif isinstance(query, Query) and query._timeout and elapsed_ms >= query._timeout:
+        QUERY_TIMEOUTS.labels(_current_endpoint.get(), index_name, "partial").inc()
+
+
+def _search_failed(index_name, query, error):
+    if _is_timeout_error(error):
+        _count_timeout(index_name, query, 0, error)
+
+
+def _search_finished(index_name, query, query_params, started):
+    """Count a partial (timed-out) result and return the slow-query log entry of the search, if it is sampled."""
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _count_timeout(index_name, query, elapsed_ms)
+    return _slow_query_entry(index_name, query, query_params, elapsed_ms)
+
+
+def _queue_slow_query(pipe, entry):
+    """Queue the push of a slow-query log entry on pipe (sync or asyncio), keeping the list capped."""
+    pipe.lpush(SLOW_QUERY_LOG_KEY, entry)
+    pipe.ltrim(SLOW_QUERY_LOG_KEY, 0, SLOW_QUERY_LOG_SIZE - 1)
+
+
+def search(client, index_name, query, query_params=None):
+    """
+    FT.SEARCH with hot-path instrumentation: applies the server-side TIMEOUT, times the round trip, samples FT.PROFILE
+    for the server-side time and records slow queries in a capped Redis list.
+    """
+    query = with_timeout(query)
+    profile_server_time = isinstance(query, Query) and random.random() < PROFILE_SAMPLE_RATE
+    started = time.perf_counter()
+    try:
+        with timed(STAGE_REDIS):
+            if profile_server_time:
+                results, profile = client.ft(index_name).profile(query, query_params=query_params)
+            else:
+                results = client.ft(index_name).search(query, query_params=query_params)
+    except ResponseError as e:
+        _search_failed(index_name, query, e)
+        raise
+    entry = _search_finished(index_name, query, query_params, started)
+
+    if profile_server_time:
+        server_seconds = _profile_server_seconds(profile)
+        if server_seconds is not None:
+            STAGE_LATENCY.labels(_current_endpoint.get(), STAGE_SERVER).observe(server_seconds)
+
+    if entry:
+        pipe = r.pipeline(transaction=False)
+        _queue_slow_query(pipe, entry)
+        pipe.execute()
+    return results
+
+
+async def async_search(client, index_name, query, query_params=None):
+    """redis.asyncio counterpart of search (without FT.PROFILE sampling)."""
+    query = with_timeout(query)
+    started = time.perf_counter()
+    try:
+        with timed(STAGE_REDIS):
+            results = await client.ft(index_name).search(query, query_params=query_params)
+    except ResponseError as e:
+        _search_failed(index_name, query, e)
+        raise
+    entry = _search_finished(index_name, query, query_params, started)
+
+    if entry:
+        pipe = r_async.pipeline(transaction=False)
+        _queue_slow_query(pipe, entry)
+        await pipe.execute()
+    return results
@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 # Define a counter for tracking cache hits and misses
 CACHE_HITS = Counter('cache_hits', 'Number of cache hits')
@@ -11,4 +11,46 @@ REQUEST_DURATION = Histogram('request_duration_seconds', 'HTTP request duration
 HITS = Counter('hits', 'Number of hits', ['type'])
 
 # Define a histogram to track latencies with a label for the type of hit
-LATENCY = Histogram('latency_seconds', 'Latency of cache and DB hits in seconds', ['type'])
\ No newline at end of file
+LATENCY = Histogram('latency_seconds', 'Latency of cache and DB hits in seconds', ['type'])
+
+# Define a gauge for the connections of each Redis pool, by state (max, in_use, idle)
+REDIS_POOL_CONNECTIONS = Gauge('redis_pool_connections', 'Connections of each Redis pool by state', ['pool', 'state'])
+
+# Define a counter of the read connections checked out from each node (read replicas, or the primary as fallback)
+REDIS_READ_ROUTING = Counter('redis_read_routing', 'Read connections checked out by node', ['node'])
+
+# Define histograms and a counter for the micro-batching query encoder
+ENCODER_BATCH_SIZE = Histogram('query_encoder_batch_size', 'Texts per batched encode call',
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+ENCODER_QUEUE_WAIT = Histogram('query_encoder_queue_wait_seconds', 'Time a query waited in the encoder queue',
+                               buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+ENCODER_CACHE = Counter('query_encoder_cache', 'Query embedding LRU lookups', ['result'])
+
+# Define metrics for the process-local hot embedding cache
+HOT_EMBEDDING_CACHE = Counter('hot_embedding_cache', 'Hot embedding LRU lookups', ['result'])
+HOT_EMBEDDING_INVALIDATIONS = Counter('hot_embedding_invalidations', 'Keys evicted by Redis invalidations (1 per full flush)')
+HOT_EMBEDDING_CACHE_ENTRIES = Gauge('hot_embedding_cache_entries', 'Embeddings held by the hot embedding LRU')
+
+# Define a histogram for the end-to-end latency of each endpoint, and one for each hot-path stage of a request
+SERVICE_LATENCY = Histogram('service_latency_seconds', 'Service latency in seconds', ['type'])
+STAGE_LATENCY = Histogram('stage_latency_seconds', 'Latency of each hot-path stage in seconds', ['endpoint', 'stage'],
+                          buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+
+# Define a gauge for the backfill progress (0 to 1) of the index version being built behind each alias
+INDEX_BUILD_PROGRESS = Gauge('index_build_progress', 'Backfill progress of the index version being built', ['index'])
+
+# Define metrics for the incremental PostgreSQL to Redis sync
+SYNC_LAG = Gauge('sync_lag_seconds', 'Age of the oldest PostgreSQL change not yet synced to Redis')
+SYNC_ROWS = Counter('sync_rows', 'Rows handled by the PostgreSQL to Redis sync', ['action'])
+SYNC_BATCH_DURATION = Histogram('sync_batch_duration_seconds', 'Duration of each sync batch in seconds')
+
+# Define metrics for admission control: requests shed by reason, and the requests running and queued per endpoint
+REQUESTS_SHED = Counter('requests_shed', 'Requests rejected by admission control', ['endpoint', 'reason'])
+ADMISSION_IN_FLIGHT = Gauge('admission_in_flight', 'Requests running within the concurrency limit', ['endpoint'])
+ADMISSION_QUEUED = Gauge('admission_queued', 'Requests waiting for a concurrency slot', ['endpoint'])
+
+# Define counters for FT.SEARCH queries that reached their TIMEOUT (failed, or partial results returned) and for
+# user queries rejected by the complexity guard
+QUERY_TIMEOUTS = Counter('query_timeouts', 'FT.SEARCH queries that reached their TIMEOUT',
+                         ['endpoint', 'index', 'outcome'])
+QUERIES_REJECTED = Counter('queries_rejected', 'User queries rejected by the complexity guard', ['reason'])
@@ -0,0 +1,28 @@
+import threading
+
+from config.logger_config import setup_logger
+
+# Setup logger
+logger = setup_logger()
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(model_name=MODEL_NAME):
+    """
+    Return the process-wide SentenceTransformer for model_name, loading it on first use.
+    sentence_transformers (and torch) are only imported here, so processes that never encode never pay for them.
+    """
+    model = _models.get(model_name)
+    if model is None:
+        with _models_lock:
+            if model_name not in _models:
+                from sentence_transformers import SentenceTransformer
+
+                logger.info(f"Loading SentenceTransformer model {model_name}")
+                _models[model_name] = SentenceTransformer(model_name)
+            model = _models[model_name]
+    return model
@@ -0,0 +1,112 @@
+"""
+Optional PCA reduction of embeddings.
+
+With GABS_VECTOR_DIM below the model's 384 dimensions, every embedding is projected onto the top principal components
+before it is written to Redis or sent as a KNN query, shrinking documents and HNSW graphs proportionally. The
+projection is fitted once, at load time, on a sample of both catalogs, and stored in Redis so the app servers and
+later loads (books and games share it, keeping them in one space) apply the same one.
+
+Changing GABS_VECTOR_DIM, or deleting PROJECTION_KEY to refit, invalidates every stored vector: reload both catalogs
+and rebuild the indexes afterwards.
+"""
+import io
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from cache.embedding_store import encode_texts
+from cache.redis_utils import get_binary_redis_client
+from config.logger_config import setup_logger
+from config.model_provider import MODEL_NAME
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+MODEL_DIM = 384
+VECTOR_DIM = int(os.getenv('GABS_VECTOR_DIM', MODEL_DIM))
+PROJECTION_KEY = "vectors:projection"
+PROJECTION_FIT_SAMPLE = int(os.getenv('GABS_PROJECTION_FIT_SAMPLE', 20000))
+
+r_binary = get_binary_redis_client()
+
+_projection = None
+_projection_lock = threading.Lock()
+
+
+def is_reduced():
+    return VECTOR_DIM < MODEL_DIM
+
+
+def fit_projection(vectors, dim=VECTOR_DIM):
+    """
+    Fit a PCA of vectors down to dim components. Returns (mean, components) with components of shape (dim, D).
+    Raises ValueError with fewer than dim vectors: the SVD would return fewer components than asked for.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < dim:
+        raise ValueError(f"A PCA to {dim} dimensions needs at least {dim} sample vectors, got {len(vectors)}: "
+                         f"lower GABS_VECTOR_DIM or load a larger catalog")
+    mean = vectors.mean(axis=0)
+    _, singular_values, components = np.linalg.svd(vectors - mean, full_matrices=False)
+    variance = singular_values ** 2
+    logger.info(f"PCA to {dim} dimensions keeps {variance[:dim].sum() / variance.sum():.1%} of the variance "
+                f"({len(vectors)} samples)")
+    return mean, components[:dim]
+
+
+def apply_projection(vectors, mean, components):
+    """Project vectors and re-normalize them, so cosine distances stay meaningful."""
+    projected = (np.asarray(vectors, dtype=np.float32) - mean) @ components.T
+    return projected / np.maximum(np.linalg.norm(projected, axis=-1, keepdims=True), 1e-12)
+
+
+def save_projection(mean, components):
+    global _projection
+    buffer = io.BytesIO()
+    np.savez(buffer, mean=mean, components=components)
+    r_binary.set(PROJECTION_KEY, buffer.getvalue())
+    with _projection_lock:
+        _projection = (mean, components)
+
+
+def load_projection():
+    """Return the stored (mean, components), or None when no projection has been fitted yet."""
+    global _projection
+    if _projection is None:
+        with _projection_lock:
+            if _projection is None:
+                payload = r_binary.get(PROJECTION_KEY)
+                if payload is None:
+                    return None
+                stored = np.load(io.BytesIO(payload))
+                _projection = (stored["mean"], stored["components"])
+    return _projection
+
+
+def project(vectors):
+    """Reduce model embeddings (one vector or a matrix) to VECTOR_DIM. A no-op unless GABS_VECTOR_DIM is set."""
+    if not is_reduced():
+        return vectors
+    projection = load_projection()
+    if projection is None:
+        raise RuntimeError(f"GABS_VECTOR_DIM={VECTOR_DIM} but no projection is stored in {PROJECTION_KEY}; "
+                           f"load a catalog first to fit it")
+    mean, components = projection
+    if components.shape[0] != VECTOR_DIM:
+        raise RuntimeError(f"The stored projection has {components.shape[0]} dimensions, not {VECTOR_DIM}")
+    return apply_projection(vectors, mean, components)
+
+
+def ensure_projection(texts, model_name=MODEL_NAME):
+    """Fit and store the projection from a sample of texts unless reduction is off or one is already stored."""
+    if not is_reduced() or load_projection() is not None:
+        return
+    texts = list(texts)
+    mean, components = fit_projection(encode_texts(texts, model_name), VECTOR_DIM)
+    save_projection(mean, components)
+    logger.info(f"Projection to {VECTOR_DIM} dimensions stored in {PROJECTION_KEY}")
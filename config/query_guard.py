@@ -0,0 +1,81 @@
+"""
+Complexity guard for raw RediSearch query syntax taken from users.
+
+Tag search and the JSON search API pass the user's query straight to RediSearch so people can use its syntax, which
+also lets a single request ask for a very expensive query: one-letter prefixes and leading wildcards expand against
+the whole term dictionary, Levenshtein distances above 1 explode the candidate set, and long or deeply nested
+unions multiply both. Such queries are rejected with a 400 before they reach Redis.
+"""
+import os
+import re
+
+from dotenv import load_dotenv
+
+from config.logger_config import setup_logger
+from config.metrics_config import QUERIES_REJECTED
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+QUERY_MAX_LENGTH = int(os.getenv('GABS_QUERY_MAX_LENGTH', 256))
+QUERY_MAX_TERMS = int(os.getenv('GABS_QUERY_MAX_TERMS', 16))
+QUERY_MAX_NESTING = int(os.getenv('GABS_QUERY_MAX_NESTING', 4))
+QUERY_GUARD_MIN_PREFIX = int(os.getenv('GABS_QUERY_MIN_PREFIX', 3))
+
+# Escaped characters are matched literally, so they are blanked out before looking for operators
+ESCAPED_CHAR = re.compile(r"\\.")
+QUERY_TERM = re.compile(r"[^\s|(){}\[\]]+")
+# Field selectors, negation and optional markers in front of a term
+TERM_MODIFIERS = re.compile(r"^(@\w+:)?[-~]*")
+# The w'...' wildcard operator, only where a term starts (so "Andrew's" is an ordinary word)
+WILDCARD_PATTERN = re.compile(r"(?<![\w\\])w'")
+
+
+def _nesting_depth(text):
+    depth = deepest = 0
+    for char in text:
+        if char in "({[":
+            depth += 1
+            deepest = max(deepest, depth)
+        elif char in ")}]":
+            depth -= 1
+    return deepest
+
+
+def _complexity_violation(query):
+    """Return (reason, message) for the first limit query exceeds, or None."""
+    if len(query) > QUERY_MAX_LENGTH:
+        return "too_long", f"query is longer than {QUERY_MAX_LENGTH} characters"
+    text = ESCAPED_CHAR.sub("x", query)
+    if WILDCARD_PATTERN.search(text):
+        return "wildcard_pattern", "wildcard patterns (w'...') are not allowed"
+    if _nesting_depth(text) > QUERY_MAX_NESTING:
+        return "too_deep", f"query nests more than {QUERY_MAX_NESTING} levels of brackets"
+    terms = [TERM_MODIFIERS.sub("", term) for term in QUERY_TERM.findall(text)]
+    terms = [term for term in terms if term]
+    if len(terms) > QUERY_MAX_TERMS:
+        return "too_many_terms", f"query has more than {QUERY_MAX_TERMS} terms"
+    for term in terms:
+        if term == "*":
+            continue
+        if term.startswith("*"):
+            return "leading_wildcard", f"'{term}': suffix and infix wildcards are not allowed"
+        if term.endswith("*") and len(term.rstrip("*")) < QUERY_GUARD_MIN_PREFIX:
+            return "short_prefix", f"'{term}': prefixes need at least {QUERY_GUARD_MIN_PREFIX} characters"
+        if term.startswith("%%"):
+            return "fuzzy", f"'{term}': fuzzy matching is limited to a distance of 1 (%term%)"
+    return None
+
+
+def query_complexity_error(query):
+    """Return why query is too expensive to run, or None if it is acceptable."""
+    violation = _complexity_violation(query or "")
+    if violation is None:
+        return None
+    reason, message = violation
+    QUERIES_REJECTED.labels(reason).inc()
+    logger.warning(f"Rejected query {query[:QUERY_MAX_LENGTH]!r}: {message}")
+    return message
@@ -0,0 +1,56 @@
+import json
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Documents are stored either as RedisJSON documents with the embedding as a list of floats (the default), or as
+# HASHes with the embedding as a raw vector blob that can be handed to a KNN query as-is.
+LAYOUT_JSON = "json"
+LAYOUT_HASH = "hash"
+STORAGE_LAYOUT = os.getenv('GABS_STORAGE_LAYOUT', LAYOUT_JSON).lower()
+
+# Element type of indexed vectors and of the blobs sent to KNN queries. FLOAT16 halves the memory of every vector in
+# the HNSW graphs (and in HASH documents) for a small recall loss, see benchmarks/compact_vectors.py.
+VECTOR_TYPE = os.getenv('GABS_VECTOR_TYPE', "FLOAT32").upper()
+VECTOR_DTYPE = np.float16 if VECTOR_TYPE == "FLOAT16" else np.float32
+
+EMBEDDING_FIELD = "embedding"
+
+# Every document carries its type, so the unified index can pre-filter KNN queries to games (or books)
+DOC_TYPE_FIELD = "doc_type"
+DOC_TYPE_BOOK = "book"
+DOC_TYPE_GAME = "game"
+
+
+def embedding_to_blob(embedding):
+    """Convert an embedding (list, nested JSONPath result or ndarray) to the VECTOR_TYPE bytes used by KNN queries."""
+    return np.asarray(embedding, dtype=VECTOR_DTYPE).tobytes()
+
+
+def blob_to_vector(blob):
+    """Convert a stored vector blob back to a float32 array."""
+    return np.frombuffer(blob, dtype=VECTOR_DTYPE).astype(np.float32)
+
+
+def blob_to_embedding(blob):
+    """Convert a stored vector blob back to a list of floats."""
+    return blob_to_vector(blob).tolist()
+
+
+def to_hash_mapping(document, embedding):
+    """Flatten a document into a HASH mapping, storing the embedding as a VECTOR_TYPE blob."""
+    mapping = {}
+    for field, value in document.items():
+        if field == EMBEDDING_FIELD or value is None:
+            continue
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        elif isinstance(value, bool):
+            value = int(value)
+        mapping[field] = value
+    mapping[EMBEDDING_FIELD] = embedding_to_blob(embedding)
+    return mapping
@@ -0,0 +1,62 @@
+"""
+HNSW attributes of the embedding field of each index.
+
+Every parameter can be set for all indexes (GABS_HNSW_M) or for one of them (GABS_GAMES_IDX_HNSW_M), the latter
+winning. Pick the values with the tuning harness (python -m benchmarks.hnsw_tuning), then rebuild the index behind
+its alias (python -m config.index_manager) for them to take effect.
+"""
+import os
+
+from dotenv import load_dotenv
+
+from config.catalog import BOOKS_CATALOG_DIR, GAMES_CATALOG_DIR, is_catalog, read_manifest
+from config.index_names import BOOKS_INDEX, GAMES_INDEX, UNIFIED_INDEX
+from config.projection import VECTOR_DIM
+from config.storage import VECTOR_TYPE
+
+# Load environment variables
+load_dotenv()
+
+DISTANCE_METRIC = "COSINE"
+
+# RediSearch's own defaults, so an unconfigured index behaves as before
+HNSW_DEFAULTS = {"M": 16, "EF_CONSTRUCTION": 200, "EF_RUNTIME": 10}
+MIN_INITIAL_CAP = 1500
+
+# Catalogs whose documents each index holds, used to size INITIAL_CAP
+INDEX_CATALOGS = {
+    BOOKS_INDEX: [BOOKS_CATALOG_DIR],
+    GAMES_INDEX: [GAMES_CATALOG_DIR],
+    UNIFIED_INDEX: [GAMES_CATALOG_DIR, BOOKS_CATALOG_DIR],
+}
+
+
+def env_prefix(index_name):
+    return f"GABS_{index_name.upper()}_HNSW_"
+
+
+def hnsw_setting(index_name, name, default):
+    return int(os.getenv(f"{env_prefix(index_name)}{name}", os.getenv(f"GABS_HNSW_{name}", default)))
+
+
+def default_initial_cap(index_name):
+    """The number of documents in the catalogs behind index_name, so the graph is not regrown during a load."""
+    records = sum(read_manifest(catalog_dir)["records"] for catalog_dir in INDEX_CATALOGS.get(index_name, [])
+                  if is_catalog(catalog_dir))
+    return max(records, MIN_INITIAL_CAP)
+
+
+def hnsw_params(index_name):
+    """Return the configured M, EF_CONSTRUCTION, EF_RUNTIME and INITIAL_CAP of index_name."""
+    params = {name: hnsw_setting(index_name, name, default) for name, default in HNSW_DEFAULTS.items()}
+    params["INITIAL_CAP"] = hnsw_setting(index_name, "INITIAL_CAP", default_initial_cap(index_name))
+    return params
+
+
+def vector_field_attributes(index_name, hnsw=None):
+    """
+    Attributes of the HNSW embedding field of index_name. hnsw overrides the configured parameters, e.g. to build a
+    candidate index while tuning.
+    """
+    return {"TYPE": VECTOR_TYPE, "DIM": VECTOR_DIM, "DISTANCE_METRIC": DISTANCE_METRIC,
+            **hnsw_params(index_name), **(hnsw or {})}
@@ -2,15 +2,23 @@ import os
 
 from flask import Flask, request, render_template, jsonify
 
-from cache.redis_utils import wait_for_redis_to_load
+from cache.cache import cached_result
+from cache.redis_utils import wait_for_redis_to_load, get_read_redis_client
+from config.admission import admission_controlled
+from config.autocomplete import SUGGESTION_SOURCES, autocomplete
 from config.index_manager import ensure_indexes_exist
+from config.instrumentation import instrumented, timed, STAGE_SERIALIZATION
 from config.logger_config import setup_logger
+from config.query_guard import query_complexity_error
 from dotenv import load_dotenv
-from prometheus_client import make_wsgi_app, Histogram
+from prometheus_client import make_wsgi_app
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from books_vector_redis_demo import search_books_by_tag, get_book_recommendations, get_book_embedding, \
-    recommend_games_by_book_embedding
-from twitch_igdb_games_to_json import search_games_by_name
+    recommend_games_by_book_embedding, get_book_recommendations_many, parse_book_ids, BATCH_RECOMMENDATIONS_MAX_IDS
+from config.index_names import BOOKS_INDEX, GAMES_INDEX
+from search_api import SEARCH_FIELDS, RECOMMENDED_GAME_FIELDS, parse_fields, search_page, project, compact_response
+from semantic_search import semantic_search, SEMANTIC_TARGETS
+from twitch_igdb_games_to_json import search_games_by_name, games_by_name_query
 
 # Load environment variables
 load_dotenv()
@@ -18,11 +26,10 @@ load_dotenv()
 # Setup logger
 logger = setup_logger()
 
-# Define a Histogram for tracking latencies with labels for cache and db
-LATENCY = Histogram('service_latency_seconds', 'Service latency in seconds', ['type'])
-
 app = Flask(__name__)
 
+r = get_read_redis_client()
+
 
 # ff_client = FeatureFlagClient()
 
@@ -43,31 +50,146 @@ def books():
 
 
 @app.route('/search_books', methods=['POST'])
+@instrumented('search_books')
+@admission_controlled('search_books')
 def search_books():
     tag = request.form['tag_query']
-    books = search_books_by_tag(tag)
-    return jsonify(books)
+    error = query_complexity_error(tag)
+    if error:
+        return jsonify({"error": error}), 400
+    books = cached_result('search_books', tag, lambda: search_books_by_tag(tag))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(books)
 
 
 @app.route('/search_games', methods=['POST'])
+@instrumented('search_games')
+@admission_controlled('search_games')
 def search_games():
     game_name = request.form['game_query']
-    games = search_games_by_name(game_name)
-    return jsonify(games)
+    games = cached_result('search_games', game_name, lambda: search_games_by_name(game_name))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(games)
+
+
+@app.route('/autocomplete')
+@instrumented('autocomplete')
+@admission_controlled('autocomplete')
+def autocomplete_endpoint():
+    source = request.args.get('type', 'games')
+    if source not in SUGGESTION_SOURCES:
+        return jsonify({"error": f"type must be one of {sorted(SUGGESTION_SOURCES)}"}), 400
+    suggestions = autocomplete(r, source, request.args.get('q', ''),
+                               fuzzy=request.args.get('fuzzy', 'false').lower() in ('1', 'true', 'yes'),
+                               max_results=request.args.get('max', type=int))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(suggestions)
 
 
 @app.route('/recommend_books', methods=['POST'])
+@instrumented('recommend_books')
+@admission_controlled('recommend_books')
 def recommend_books():
     book_id = request.form['book_id']
-    recommendations = get_book_recommendations(book_id)
-    return jsonify(recommendations)
+    recommendations = cached_result('recommend_books', book_id, lambda: get_book_recommendations(book_id))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(recommendations)
 
 
 @app.route('/recommend_games', methods=['POST'])
+@instrumented('recommend_games')
+@admission_controlled('recommend_games')
 def recommend_games():
     book_id = request.form['book_id']
-    recommendations = recommend_games_by_book_embedding(book_id)
-    return render_template('books.html', recommendations=recommendations)
+    recommendations = cached_result('recommend_games', book_id, lambda: recommend_games_by_book_embedding(book_id))
+    with timed(STAGE_SERIALIZATION):
+        return render_template('books.html', recommendations=recommendations)
+
+
+@app.route('/recommend_books_batch', methods=['POST'])
+@instrumented('recommend_books_batch')
+@admission_controlled('recommend_books_batch')
+def recommend_books_batch():
+    book_ids = parse_book_ids(request.get_json(silent=True), request.form)
+    if not book_ids:
+        return jsonify({"error": "book_ids is required"}), 400
+    if len(book_ids) > BATCH_RECOMMENDATIONS_MAX_IDS:
+        return jsonify({"error": f"at most {BATCH_RECOMMENDATIONS_MAX_IDS} distinct book_ids per request"}), 400
+    recommendations = cached_result('recommend_books_batch', ",".join(sorted(book_ids)),
+                                    lambda: get_book_recommendations_many(book_ids))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(recommendations)
+
+
+@app.after_request
+def compact_api_responses(response):
+    """ETag and gzip for the JSON API."""
+    if not request.path.startswith('/api/') or response.status_code != 200 or response.direct_passthrough:
+        return response
+    status, body, headers = compact_response(response.get_data(), request.headers.get('If-None-Match'),
+                                             request.headers.get('Accept-Encoding'))
+    response.set_data(body)
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+def paged_search(index_name, query_string):
+    fields = parse_fields(request.args.get('fields'), index_name)
+    if fields is None:
+        return jsonify({"error": f"fields must be a subset of {SEARCH_FIELDS[index_name][0]}"}), 400
+    page = search_page(index_name, query_string, fields, request.args.get('page_size', type=int),
+                       request.args.get('cursor'))
+    if page is None:
+        return jsonify({"error": "cursor is invalid or has expired, restart from the first page"}), 410
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(page)
+
+
+@app.route('/api/books/search')
+@instrumented('api_search_books')
+@admission_controlled('api_search_books')
+def api_search_books():
+    query_string = request.args.get('q', '*')
+    error = query_complexity_error(query_string)
+    if error:
+        return jsonify({"error": error}), 400
+    return paged_search(BOOKS_INDEX, query_string)
+
+
+@app.route('/api/games/search')
+@instrumented('api_search_games')
+@admission_controlled('api_search_games')
+def api_search_games():
+    return paged_search(GAMES_INDEX, games_by_name_query(request.args.get('name', '')).query_string())
+
+
+@app.route('/api/recommend_games')
+@instrumented('api_recommend_games')
+@admission_controlled('api_recommend_games')
+def api_recommend_games():
+    book_id = request.args.get('book_id', '')
+    fields = parse_fields(request.args.get('fields'), field_spec=RECOMMENDED_GAME_FIELDS)
+    if not book_id or fields is None:
+        return jsonify({"error": "book_id is required and fields must be a subset of "
+                                 f"{RECOMMENDED_GAME_FIELDS[0]}"}), 400
+    recommendations = cached_result('recommend_games', book_id, lambda: recommend_games_by_book_embedding(book_id))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(project(recommendations, fields))
+
+
+@app.route('/semantic_search', methods=['POST'])
+@instrumented('semantic_search')
+@admission_controlled('semantic_search')
+def semantic_search_endpoint():
+    text = request.form['query']
+    target = request.form.get('index', 'books')
+    k = request.form.get('k', 10, type=int)
+    if target not in SEMANTIC_TARGETS:
+        return jsonify({"error": f"index must be one of {sorted(SEMANTIC_TARGETS)}"}), 400
+    results = cached_result('semantic_search', f"{target}|{k}|{text}", lambda: semantic_search(text, target, k))
+    with timed(STAGE_SERIALIZATION):
+        return jsonify(results)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,382 @@
+import argparse
+import hashlib
+import heapq
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from redis.commands.search.query import Query
+from redis.commands.search.result import Result
+
+from books_vector_redis_demo import games_knn_query
+from cache.cache import bump_index_version
+from cache.neighbor_tables import BOOK_NEIGHBORS, GAME_NEIGHBORS, NEIGHBORS_PREFIX, get_neighbors_many, put_neighbors, \
+    indexed_ids_key, neighbors_key, neighbor_ids_key, referrers_key, get_neighbor_ids_many, changed_ids_key, \
+    stale_tables_key, worst_scores_key
+from cache.redis_utils import get_redis_client, get_binary_redis_client
+from config.index_names import BOOKS_INDEX, GAMES_INDEX
+from config.logger_config import setup_logger
+from config.storage import STORAGE_LAYOUT, LAYOUT_HASH, EMBEDDING_FIELD, blob_to_vector, embedding_to_blob
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+# Initialize global variables
+TOP_K_BOOKS = int(os.getenv('GABS_NEIGHBORS_TOP_K_BOOKS', 5))
+TOP_K_GAMES = int(os.getenv('GABS_NEIGHBORS_TOP_K_GAMES', 20))
+CHUNK_SIZE = int(os.getenv('GABS_NEIGHBORS_CHUNK_SIZE', 4096))
+MERGE_MAX_CANDIDATES = int(os.getenv('GABS_NEIGHBORS_MERGE_MAX_CANDIDATES', 10000))
+# Largest cosine distance, recorded as the worst score of tables that are not full yet (anything can enter them)
+MAX_DISTANCE = 2.0
+
+# Text fields kept next to each neighbor, matching what the recommendation endpoints return
+BOOK_FIELDS = ["title", "author"]
+GAME_FIELDS = ["name", "summary"]
+# Fields of each table entry besides the score, in the order of the live responses (book->game entries have no id)
+TABLE_FIELDS = {BOOK_NEIGHBORS: BOOK_FIELDS + ["id"], GAME_NEIGHBORS: GAME_FIELDS}
+# Index searched for the candidates of each kind of table
+KNN_INDEX = {BOOK_NEIGHBORS: BOOKS_INDEX, GAME_NEIGHBORS: GAMES_INDEX}
+
+# Initialize Redis connections
+r = get_redis_client()
+r_binary = get_binary_redis_client()
+
+
+def doc_id_of(item):
+    return item["id"].split(":", 1)[1]
+
+
+def scan_ids(prefix):
+    """Return the IDs of all documents stored under "<prefix>:"."""
+    return [key.split(":", 1)[1] for key in r.scan_iter(match=f"{prefix}:*", count=1000)]
+
+
+def fetch_documents(prefix, ids, fields, layout=STORAGE_LAYOUT):
+    """Fetch text fields and normalized embeddings of the given documents. Documents without an embedding are dropped."""
+    items = []
+    vectors = []
+    if layout == LAYOUT_HASH:
+        pipe = r_binary.pipeline(transaction=False)
+        for doc_id in ids:
+            pipe.hmget(f"{prefix}:{doc_id}", fields + [EMBEDDING_FIELD])
+        for doc_id, values in zip(ids, pipe.execute()):
+            if not values[-1]:
+                continue
+            item = {field: (value or b"").decode("utf-8") for field, value in zip(fields, values[:-1])}
+            item["id"] = f"{prefix}:{doc_id}"
+            items.append(item)
+            vectors.append(blob_to_vector(values[-1]))
+    else:
+        pipe = r.pipeline(transaction=False)
+        paths = [f"$.{field}" for field in fields] + ["$.embedding"]
+        for doc_id in ids:
+            pipe.json().get(f"{prefix}:{doc_id}", *paths)
+        for doc_id, values in zip(ids, pipe.execute()):
+            if not values or not values.get("$.embedding"):
+                continue
+            item = {field: (values.get(f"$.{field}") or [""])[0] for field in fields}
+            item["id"] = f"{prefix}:{doc_id}"
+            items.append(item)
+            vectors.append(np.asarray(values["$.embedding"][0], dtype=np.float32))
+
+    if not vectors:
+        return items, np.empty((0, 0), dtype=np.float32)
+    matrix = np.stack(vectors)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return items, matrix
+
+
+def iter_document_chunks(prefix, ids, fields, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(ids), chunk_size):
+        items, matrix = fetch_documents(prefix, ids[start:start + chunk_size], fields)
+        if items:
+            yield items, matrix
+
+
+def compute_top_k(query_matrix, candidate_chunks, k):
+    """Exact top-k cosine neighbors of every query row over all candidate chunks."""
+    best = [[] for _ in range(len(query_matrix))]
+    for items, matrix in candidate_chunks:
+        distances = 1 - query_matrix @ matrix.T
+        top = min(k, len(items))
+        columns = np.argpartition(distances, top - 1, axis=1)[:, :top]
+        for row in range(len(query_matrix)):
+            candidates = best[row] + [(float(distances[row, column]), items[column]) for column in columns[row]]
+            best[row] = heapq.nsmallest(k, candidates, key=lambda candidate: candidate[0])
+    return best
+
+
+def as_table(kind, neighbors):
+    """Turn (distance, item) pairs into the list returned by the endpoints."""
+    return [{**{field: item[field] for field in TABLE_FIELDS[kind]}, "score": str(round(distance, 6))}
+            for distance, item in neighbors]
+
+
+def from_table(table, neighbor_ids, prefix):
+    """Turn a stored table and the IDs it lists back into (distance, item) pairs."""
+    return [(float(entry["score"]),
+             {**{key: value for key, value in entry.items() if key != "score"}, "id": f"{prefix}:{doc_id}"})
+            for entry, doc_id in zip(table or [], neighbor_ids)]
+
+
+def write_tables(kind, book_items, tables, k):
+    book_ids = [doc_id_of(item) for item in book_items]
+    previous = get_neighbor_ids_many(kind, book_ids)
+    pipe = r.pipeline(transaction=False)
+    for i, (book_id, neighbors, previous_ids) in enumerate(zip(book_ids, tables, previous)):
+        put_neighbors(pipe, kind, book_id, as_table(kind, neighbors), [doc_id_of(item) for _, item in neighbors],
+                      previous_ids)
+        pipe.zadd(worst_scores_key(kind), {book_id: neighbors[-1][0] if len(neighbors) >= k else MAX_DISTANCE})
+        if i % 500 == 499:
+            pipe.execute()
+    pipe.execute()
+
+
+def delete_tables(kind, book_ids):
+    """Delete the tables of books that are gone, with their reverse references."""
+    pipe = r.pipeline(transaction=False)
+    for book_id, previous_ids in zip(book_ids, get_neighbor_ids_many(kind, book_ids)):
+        for doc_id in previous_ids:
+            pipe.srem(referrers_key(kind, doc_id), book_id)
+        pipe.delete(neighbors_key(kind, book_id), neighbor_ids_key(kind, book_id))
+        pipe.zrem(worst_scores_key(kind), book_id)
+    pipe.execute()
+
+
+def fingerprint(item, vector, fields):
+    """Digest of the text fields and embedding of a document, to notice when it is reloaded with different content."""
+    digest = hashlib.sha1(vector.tobytes())
+    for field in fields:
+        digest.update(b"\0" + str(item[field]).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def fingerprinted(chunks, fields, fingerprints):
+    """Pass document chunks through, recording the fingerprint of every document on the way."""
+    for items, matrix in chunks:
+        for item, vector in zip(items, matrix):
+            fingerprints[doc_id_of(item)] = fingerprint(item, vector, fields)
+        yield items, matrix
+
+
+def find_changes(prefix, ids, fields):
+    """
+    Sort the documents marked as changed by the loaders and the sync into those whose content differs from what the
+    tables account for, and those that are gone. Returns (items, matrix) of the former, the IDs of the latter and the
+    fingerprints of the former.
+    """
+    items, matrix = fetch_documents(prefix, ids, fields)
+    present = {doc_id_of(item) for item in items}
+    removed = [doc_id for doc_id in ids if doc_id not in present]
+    recorded = dict(zip(present, r.hmget(indexed_ids_key(prefix), list(present)))) if present else {}
+    fingerprints = {}
+    keep = []
+    for i, (item, vector) in enumerate(zip(items, matrix)):
+        doc_id = doc_id_of(item)
+        digest = fingerprint(item, vector, fields)
+        if recorded[doc_id] != digest:
+            fingerprints[doc_id] = digest
+            keep.append(i)
+    return [items[i] for i in keep], matrix[keep], removed, fingerprints
+
+
+def referrers(kind, doc_ids):
+    """IDs of the books whose `kind` table lists any of doc_ids."""
+    pipe = r.pipeline(transaction=False)
+    for doc_id in doc_ids:
+        pipe.smembers(referrers_key(kind, doc_id))
+    return set().union(*pipe.execute()) if doc_ids else set()
+
+
+def record_fingerprints(prefix, fingerprints, removed=()):
+    key = indexed_ids_key(prefix)
+    doc_ids = list(fingerprints)
+    for start in range(0, len(doc_ids), 1000):
+        r.hset(key, mapping={doc_id: fingerprints[doc_id] for doc_id in doc_ids[start:start + 1000]})
+    for start in range(0, len(removed), 1000):
+        r.hdel(key, *removed[start:start + 1000])
+
+
+def knn_query(kind, k):
+    if kind == GAME_NEIGHBORS:
+        return games_knn_query(k)
+    return Query(f"*=>[KNN {k} @embedding $vec AS score]").sort_by("score", asc=True).paging(0, k) \
+        .return_fields("title", "author", "score").dialect(2)
+
+
+def knn_tables(kind, book_matrix, k):
+    """Top-k neighbors of each book row from the `kind` vector index, as (distance, item) pairs."""
+    fields = TABLE_FIELDS[kind]
+    query = knn_query(kind, k)
+    tables = []
+    for start in range(0, len(book_matrix), 500):
+        pipe = r.ft(KNN_INDEX[kind]).pipeline(transaction=False)
+        for vector in book_matrix[start:start + 500]:
+            pipe.search(query, query_params={"vec": embedding_to_blob(vector)})
+        for response in pipe.execute():
+            tables.append([(float(doc.score), {**{field: getattr(doc, field, "") for field in fields}, "id": doc.id})
+                           for doc in Result(response, True).docs])
+    return tables
+
+
+def range_query():
+    return Query("@embedding:[VECTOR_RANGE $radius $vec]=>{$YIELD_DISTANCE_AS: score}").sort_by("score", asc=True) \
+        .paging(0, MERGE_MAX_CANDIDATES).return_fields("score").dialect(2)
+
+
+def merge_changed(kind, prefix, k, items, matrix, skip):
+    """
+    Merge changed documents into the `kind` tables of the other books they now belong to. A range query on the books
+    index, bounded by the largest worst score of any table, finds the books close enough for each document to enter
+    their table, so only those tables are read and written. Returns the number of tables updated.
+    """
+    worst = r.zrange(worst_scores_key(kind), 0, 0, desc=True, withscores=True)
+    if not items or not worst:
+        return 0
+    radius = worst[0][1]
+    query = range_query()
+    entries = {}
+    for start in range(0, len(items), 500):
+        pipe = r.ft(BOOKS_INDEX).pipeline(transaction=False)
+        for vector in matrix[start:start + 500]:
+            pipe.search(query, query_params={"vec": embedding_to_blob(vector), "radius": radius})
+        for item, response in zip(items[start:start + 500], pipe.execute()):
+            docs = Result(response, True).docs
+            if len(docs) >= MERGE_MAX_CANDIDATES:
+                logger.warning(f"Neighbor tables: {item['id']} is within {radius} of more than {MERGE_MAX_CANDIDATES} "
+                               f"books, farther ones are not merged (raise GABS_NEIGHBORS_MERGE_MAX_CANDIDATES)")
+            for doc in docs:
+                book_id = doc.id.split(":", 1)[1]
+                if book_id not in skip:
+                    entries.setdefault(book_id, []).append((float(doc.score), item))
+
+    book_ids = list(entries)
+    if not book_ids:
+        return 0
+    worst_scores = r.zmscore(worst_scores_key(kind), book_ids)
+    entries = {book_id: [entry for entry in entries[book_id] if entry[0] < worst_score]
+               for book_id, worst_score in zip(book_ids, worst_scores) if worst_score is not None}
+    book_ids = [book_id for book_id, candidates in entries.items() if candidates]
+    tables = [heapq.nsmallest(k, from_table(table, neighbor_ids, prefix) + entries[book_id],
+                              key=lambda candidate: candidate[0])
+              for book_id, table, neighbor_ids in zip(book_ids, get_neighbors_many(kind, book_ids),
+                                                      get_neighbor_ids_many(kind, book_ids))]
+    write_tables(kind, [{"id": f"book:{book_id}"} for book_id in book_ids], tables, k)
+    return len(book_ids)
+
+
+def clear_tables():
+    """Delete every table and its bookkeeping. The changed-ID marks are kept, they are cleared once processed."""
+    for key in r.scan_iter(match=f"{NEIGHBORS_PREFIX}:*", count=1000):
+        if not key.startswith(changed_ids_key("")):
+            r.delete(key)
+
+
+def has_incremental_state():
+    """Whether a run of this version left the fingerprints and worst scores an incremental run builds on."""
+    return r.type(indexed_ids_key("book")) == "hash" and \
+        r.exists(worst_scores_key(BOOK_NEIGHBORS), worst_scores_key(GAME_NEIGHBORS)) == 2
+
+
+def clear_marks(prefix, doc_ids):
+    """Forget the processed changed-ID marks; marks added while the run went on are kept for the next one."""
+    for start in range(0, len(doc_ids), 1000):
+        r.srem(changed_ids_key(prefix), *doc_ids[start:start + 1000])
+
+
+def rebuild_all():
+    """Clear and recompute every table with exact NumPy scans over both catalogs."""
+    clear_tables()
+    book_ids = scan_ids("book")
+    game_ids = scan_ids("game")
+    book_prints = {}
+    game_prints = {}
+    books, books_matrix = fetch_documents("book", book_ids, BOOK_FIELDS)
+    logger.info(f"Neighbor tables: recomputing the tables of {len(books)} books")
+    for kind, prefix, fields, k, candidate_ids, fingerprints in (
+            (BOOK_NEIGHBORS, "book", BOOK_FIELDS, TOP_K_BOOKS, book_ids, book_prints),
+            (GAME_NEIGHBORS, "game", GAME_FIELDS, TOP_K_GAMES, game_ids, game_prints)):
+        if books:
+            chunks = fingerprinted(iter_document_chunks(prefix, candidate_ids, fields), fields, fingerprints)
+            write_tables(kind, books, compute_top_k(books_matrix, chunks, k), k)
+    record_fingerprints("book", book_prints)
+    record_fingerprints("game", game_prints)
+
+
+def update_changed():
+    """
+    Update the tables for the documents marked as changed since the last run. Returns whether any table changed.
+
+    New or changed books get their tables recomputed, and so does every table that lists a changed or deleted
+    document (its stored distance is stale, and dropping it would leave a gap) or was dropped by the PostgreSQL sync.
+    Those are recomputed with KNN queries on the vector indexes. Changed documents are then merged into the other
+    tables they now belong to, where they can only displace entries.
+    """
+    book_marks = list(r.smembers(changed_ids_key("book")))
+    game_marks = list(r.smembers(changed_ids_key("game")))
+    changed_books, changed_books_matrix, removed_books, book_prints = find_changes("book", book_marks, BOOK_FIELDS)
+    changed_games, changed_games_matrix, removed_games, game_prints = find_changes("game", game_marks, GAME_FIELDS)
+    logger.info(f"Neighbor tables: {len(changed_books)} new or changed books, {len(removed_books)} removed, "
+                f"{len(changed_games)} new or changed games, {len(removed_games)} removed")
+
+    updated = bool(changed_books or removed_books or changed_games or removed_games)
+    for kind, prefix, k, changed, changed_matrix, removed in (
+            (BOOK_NEIGHBORS, "book", TOP_K_BOOKS, changed_books, changed_books_matrix, removed_books),
+            (GAME_NEIGHBORS, "game", TOP_K_GAMES, changed_games, changed_games_matrix, removed_games)):
+        delete_tables(kind, removed_books)
+        stale = r.smembers(stale_tables_key(kind))
+        rebuild = {doc_id_of(item) for item in changed_books} | stale | \
+            referrers(kind, [doc_id_of(item) for item in changed] + removed)
+        rebuild -= set(removed_books)
+        if not rebuild and not changed:
+            continue
+        updated = True
+        books, books_matrix = fetch_documents("book", list(rebuild), BOOK_FIELDS)
+        if books:
+            write_tables(kind, books, knn_tables(kind, books_matrix, k), k)
+        merged = merge_changed(kind, prefix, k, changed, changed_matrix, rebuild | set(removed_books))
+        logger.info(f"Neighbor tables: recomputed {len(books)} {kind} tables, merged {len(changed)} changed "
+                    f"{prefix}s into {merged} others")
+        if removed:
+            r.delete(*[referrers_key(kind, doc_id) for doc_id in removed])
+        if stale:
+            r.srem(stale_tables_key(kind), *stale)
+
+    record_fingerprints("book", book_prints, removed_books)
+    record_fingerprints("game", game_prints, removed_games)
+    clear_marks("book", book_marks)
+    clear_marks("game", game_marks)
+    return updated
+
+
+def precompute_neighbors(full=False):
+    """
+    Build or incrementally update the book->book and book->game neighbor tables.
+
+    The loaders and the PostgreSQL sync mark every document they write or delete (`neighbors:changed:<book|game>`),
+    so an incremental run only reads those documents and the tables they affect (see update_changed). A full run
+    clears and recomputes everything with exact scans; it runs when there is no state to build on yet, and is needed
+    when the tables' shape changes (GABS_NEIGHBORS_TOP_K_* or the embedding model).
+    """
+    if full or not has_incremental_state():
+        book_marks = list(r.smembers(changed_ids_key("book")))
+        game_marks = list(r.smembers(changed_ids_key("game")))
+        rebuild_all()
+        clear_marks("book", book_marks)
+        clear_marks("game", game_marks)
+        bump_index_version()
+    elif update_changed():
+        bump_index_version()
+    logger.info("Neighbor tables are up to date.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or incrementally update the precomputed neighbor tables.")
+    parser.add_argument("--full", action="store_true",
+                        help="clear and recompute every table, e.g. after changing GABS_NEIGHBORS_TOP_K_* or the "
+                             "embedding model")
+    precompute_neighbors(parser.parse_args().full)
@@ -0,0 +1,189 @@
+"""
+JSON search API: field projection, cursor pagination and compact responses.
+
+Deep pages are read with FT.AGGREGATE ... WITHCURSOR and FT.CURSOR READ, so page N costs the same as page 1 instead of
+growing with the OFFSET. Only the requested fields are LOADed, and responses carry a weak ETag and are gzip-compressed
+when the client accepts it.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+
+from dotenv import load_dotenv
+from redis.commands.search.aggregation import AggregateRequest, Cursor
+from redis.exceptions import ResponseError
+
+from cache.redis_utils import get_redis_client
+from config.index_names import BOOKS_INDEX, GAMES_INDEX
+from config.instrumentation import timed, STAGE_REDIS, STAGE_SHAPING
+from config.logger_config import setup_logger
+from config.storage import STORAGE_LAYOUT, LAYOUT_HASH
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+API_DEFAULT_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = int(os.getenv('GABS_API_MAX_PAGE_SIZE', 100))
+# Seconds a search cursor may sit idle before Redis frees it (its own default is 300); later pages then answer 410
+API_CURSOR_MAX_IDLE_SECONDS = int(os.getenv('GABS_API_CURSOR_MAX_IDLE', 60))
+# Responses smaller than this are sent uncompressed: gzip would not pay for its own overhead
+API_GZIP_MIN_BYTES = int(os.getenv('GABS_API_GZIP_MIN_BYTES', 1024))
+
+# Fields each search may project, and the ones returned when the request names none
+SEARCH_FIELDS = {
+    BOOKS_INDEX: (["title", "author", "year_published", "description", "status"], ["title", "author"]),
+    GAMES_INDEX: (["name", "summary", "url", "slug", "category", "first_release_date"], ["name", "url"]),
+}
+RECOMMENDED_GAME_FIELDS = (["name", "summary", "score"], ["name", "summary", "score"])
+
+r = get_redis_client()
+
+
+def parse_fields(fields_param, index_name=None, field_spec=None):
+    """
+    Return the requested projection for index_name (or an explicit (allowed, default) field_spec), or None if it names
+    a field that is not exposed.
+    """
+    allowed, default = field_spec or SEARCH_FIELDS[index_name]
+    if not fields_param:
+        return default
+    fields = list(dict.fromkeys(field.strip() for field in fields_param.split(",") if field.strip()))
+    if any(field not in allowed for field in fields):
+        return None
+    return fields
+
+
+def parse_page_size(page_size):
+    return max(1, min(page_size or API_DEFAULT_PAGE_SIZE, API_MAX_PAGE_SIZE))
+
+
+def encode_cursor(index_name, cursor_id, fields):
+    """Opaque cursor token handed to clients; it carries the projection so later pages keep the same shape."""
+    payload = json.dumps({"i": index_name, "c": cursor_id, "f": fields}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    """Return (index name, cursor ID, fields) of a cursor token, or None if it is malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        index_name, cursor_id, fields = payload["i"], int(payload["c"]), list(payload["f"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    # The token comes back from the client, so its projection is validated like a fields parameter
+    if index_name not in SEARCH_FIELDS or any(field not in SEARCH_FIELDS[index_name][0] for field in fields):
+        return None
+    return index_name, cursor_id, fields
+
+
+def load_args(fields, layout=STORAGE_LAYOUT):
+    """LOAD arguments for fields: attribute names on HASHes, JSONPaths (so unindexed fields work too) on JSON."""
+    args = ["@__key"]
+    for field in fields:
+        args += [f"@{field}"] if layout == LAYOUT_HASH else [f"$.{field}", "AS", field]
+    return args
+
+
+def aggregate_request(query_string, fields, page_size):
+    return AggregateRequest(query_string).load(*load_args(fields)) \
+        .cursor(count=page_size, max_idle=API_CURSOR_MAX_IDLE_SECONDS).dialect(2)
+
+
+def shape_rows(rows, fields):
+    results = []
+    for row in rows:
+        values = dict(zip(row[::2], row[1::2]))
+        results.append({"id": values.get("__key"), **{field: values.get(field) for field in fields}})
+    return results
+
+
+def page_response(index_name, result, fields):
+    cursor_id = result.cursor.cid if result.cursor else 0
+    with timed(STAGE_SHAPING):
+        return {
+            "results": shape_rows(result.rows, fields),
+            # Cursor ID 0 means Redis has no more rows (and already freed the cursor)
+            "next_cursor": encode_cursor(index_name, cursor_id, fields) if cursor_id else None,
+        }
+
+
+def page_request(index_name, query_string, fields, page_size, cursor_token=None):
+    """
+    Return the (FT.AGGREGATE request or cursor read, projection) of the page to fetch, or None when the cursor is
+    malformed or belongs to another index.
+    """
+    page_size = parse_page_size(page_size)
+    if not cursor_token:
+        return aggregate_request(query_string, fields, page_size), fields
+    decoded = decode_cursor(cursor_token)
+    if decoded is None or decoded[0] != index_name:
+        return None
+    _, cursor_id, fields = decoded
+    cursor = Cursor(cursor_id)
+    cursor.count = page_size
+    return cursor, fields
+
+
+def page_error(index_name, query_string, error):
+    """The response of a failed page read: None for an expired or unknown cursor, else an empty page."""
+    if isinstance(error, ResponseError) and "cursor" in str(error).lower():
+        logger.info(f"Cursor on {index_name} expired or unknown: {error}")
+        return None
+    logger.error(f"Error paging {index_name} for '{query_string}': {error}")
+    return {"results": [], "next_cursor": None}
+
+
+def search_page(index_name, query_string, fields, page_size, cursor_token=None):
+    """
+    Return {"results": [...], "next_cursor": token or None} for the first page of query_string, or for the page after
+    cursor_token. Returns None when the cursor is malformed, belongs to another index or has expired.
+    """
+    page = page_request(index_name, query_string, fields, page_size, cursor_token)
+    if page is None:
+        return None
+    aggregate, fields = page
+    try:
+        with timed(STAGE_REDIS):
+            result = r.ft(index_name).aggregate(aggregate)
+        return page_response(index_name, result, fields)
+    except Exception as e:
+        return page_error(index_name, query_string, e)
+
+
+async def async_search_page(client, index_name, query_string, fields, page_size, cursor_token=None):
+    """redis.asyncio counterpart of search_page."""
+    page = page_request(index_name, query_string, fields, page_size, cursor_token)
+    if page is None:
+        return None
+    aggregate, fields = page
+    try:
+        with timed(STAGE_REDIS):
+            result = await client.ft(index_name).aggregate(aggregate)
+        return page_response(index_name, result, fields)
+    except Exception as e:
+        return page_error(index_name, query_string, e)
+
+
+def project(items, fields):
+    """Project already-shaped results (e.g. recommendations) onto the requested fields."""
+    return [{field: item.get(field) for field in fields} for item in items]
+
+
+def compact_response(body, if_none_match, accept_encoding):
+    """
+    Apply the weak ETag and gzip policy to a 200 response body.
+    Returns (status, body, headers): 304 with an empty body when the client already has this representation.
+    """
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return 304, b"", headers
+    if len(body) >= API_GZIP_MIN_BYTES and "gzip" in (accept_encoding or "").lower():
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return 200, body, headers
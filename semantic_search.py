@@ -0,0 +1,201 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+from dotenv import load_dotenv
+from redis.commands.search.query import Query
+
+from cache.redis_utils import get_read_redis_client
+from config.index_names import BOOKS_INDEX, GAMES_INDEX, UNIFIED_INDEX, UNIFIED_INDEX_ENABLED
+from config.instrumentation import search, timed, STAGE_SHAPING
+from config.logger_config import setup_logger
+from config.metrics_config import ENCODER_BATCH_SIZE, ENCODER_QUEUE_WAIT, ENCODER_CACHE
+from config.model_provider import MODEL_NAME, get_model
+from config.projection import project
+from config.storage import STORAGE_LAYOUT, LAYOUT_HASH, embedding_to_blob
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+# Micro-batching: a batch is encoded once it holds ENCODER_MAX_BATCH_SIZE texts, or ENCODER_MAX_WAIT_MS after its
+# first text arrived, whichever comes first
+ENCODER_MAX_BATCH_SIZE = int(os.getenv('GABS_ENCODER_MAX_BATCH_SIZE', 32))
+ENCODER_MAX_WAIT_MS = float(os.getenv('GABS_ENCODER_MAX_WAIT_MS', 5))
+ENCODER_CACHE_SIZE = int(os.getenv('GABS_ENCODER_CACHE_SIZE', 10000))
+ENCODER_TIMEOUT_SECONDS = float(os.getenv('GABS_ENCODER_TIMEOUT', 10))
+SEMANTIC_SEARCH_MAX_K = 100
+
+# Searchable indexes, with the (field, alias) pairs to return. games_idx does not index the summary on the JSON
+# layout, so it is read through its JSON path there.
+SEMANTIC_TARGETS = {
+    "books": (BOOKS_INDEX, [("title", "title"), ("author", "author")]),
+    "games": (GAMES_INDEX, [("name", "name"),
+                            ("summary" if STORAGE_LAYOUT == LAYOUT_HASH else "$.summary", "summary")]),
+}
+if UNIFIED_INDEX_ENABLED:
+    SEMANTIC_TARGETS["unified"] = (UNIFIED_INDEX, [("name", "name"), ("summary", "summary")])
+
+r = get_read_redis_client()
+
+
+class MicroBatchEncoder:
+    """
+    Collects concurrent encode requests and runs them through the model as one batch.
+
+    Callers get a Future resolving to the vector blob of their text. Blobs are kept in a size-bounded LRU, so
+    repeated queries skip the queue altogether. The worker thread starts on first use, so forking servers start it
+    in each worker rather than in the parent.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, max_batch_size=ENCODER_MAX_BATCH_SIZE, max_wait_ms=ENCODER_MAX_WAIT_MS,
+                 cache_size=ENCODER_CACHE_SIZE):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self._queue = queue.Queue()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _cache_get(self, text):
+        with self._cache_lock:
+            blob = self._cache.get(text)
+            if blob is not None:
+                self._cache.move_to_end(text)
+            return blob
+
+    def _cache_put(self, text, blob):
+        with self._cache_lock:
+            self._cache[text] = blob
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text):
+        """Queue text for encoding and return a Future of its vector blob."""
+        future = Future()
+        blob = self._cache_get(text)
+        if blob is not None:
+            ENCODER_CACHE.labels('hit').inc()
+            future.set_result(blob)
+            return future
+        ENCODER_CACHE.labels('miss').inc()
+        self._ensure_started()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def encode(self, text, timeout=ENCODER_TIMEOUT_SECONDS):
+        """Blocking helper: return the vector blob of text."""
+        return self.submit(text).result(timeout)
+
+    def _take(self, timeout=None):
+        """
+        Take the next request off the queue, or None when its caller cancelled it. Once taken, a future can no longer
+        be cancelled, so setting its result cannot fail.
+        """
+        item = self._queue.get(timeout=timeout)
+        return item if item[1].set_running_or_notify_cancel() else None
+
+    def _run(self):
+        while True:
+            item = self._take()
+            if item is None:
+                continue
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._take(remaining)
+                except queue.Empty:
+                    break
+                if item:
+                    batch.append(item)
+            try:
+                self._encode_batch(batch)
+            except Exception as e:
+                # Whatever went wrong, no caller may be left waiting on an unresolved future
+                logger.error(f"Error encoding a batch of {len(batch)} queries: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _encode_batch(self, batch):
+        started = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            ENCODER_QUEUE_WAIT.observe(started - enqueued_at)
+
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        ENCODER_BATCH_SIZE.observe(len(texts))
+        vectors = get_model(self.model_name).encode(texts, batch_size=len(texts),
+                                                    convert_to_numpy=True).astype(np.float32)
+        blobs = {text: embedding_to_blob(vector) for text, vector in zip(texts, project(vectors))}
+        for text, blob in blobs.items():
+            self._cache_put(text, blob)
+        for text, future, _ in batch:
+            future.set_result(blobs[text])
+
+
+_query_encoder = None
+_query_encoder_lock = threading.Lock()
+
+
+def get_query_encoder():
+    """Return the process-wide MicroBatchEncoder."""
+    global _query_encoder
+    if _query_encoder is None:
+        with _query_encoder_lock:
+            if _query_encoder is None:
+                _query_encoder = MicroBatchEncoder()
+    return _query_encoder
+
+
+def semantic_knn_query(target, k):
+    _, fields = SEMANTIC_TARGETS[target]
+    query = Query(f"*=>[KNN {k} @embedding $vec AS score]").sort_by("score", asc=True).paging(0, k).dialect(2)
+    for field, alias in fields:
+        query = query.return_field(field, as_field=alias if field != alias else None)
+    return query.return_field("score")
+
+
+def shape_semantic_results(target, docs):
+    _, fields = SEMANTIC_TARGETS[target]
+    return [{**{alias: getattr(doc, alias, None) for _, alias in fields}, "id": doc.id,
+             "score": getattr(doc, "score", 0)} for doc in docs]
+
+
+def semantic_search(text, target="books", k=10):
+    """
+    Embed free text with the micro-batching encoder and run a KNN query against the target index
+    ("books", "games" or "unified").
+    """
+    index_name, _ = SEMANTIC_TARGETS[target]
+    k = max(1, min(k, SEMANTIC_SEARCH_MAX_K))
+    try:
+        embedding_as_blob = get_query_encoder().encode(text)
+        results = search(r, index_name, semantic_knn_query(target, k), query_params={"vec": embedding_as_blob})
+        with timed(STAGE_SHAPING):
+            matches = shape_semantic_results(target, results.docs)
+        logger.info(f"Semantic search on {index_name} for '{text}': {len(matches)} matches")
+        return matches
+    except Exception as e:
+        logger.error(f"Error running semantic search on {index_name} for '{text}': {e}")
+        return []
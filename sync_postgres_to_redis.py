@@ -0,0 +1,279 @@
+"""
+Incremental PostgreSQL -> Redis sync of the games table.
+
+Rows are read in (updated_at, id) order past a watermark kept in Redis, so each run only sees what changed since the
+previous one. Games whose embedded text (name, summary, storyline) changed are re-embedded; for the others the vector
+already in Redis is reused and only the document fields are rewritten. Tombstoned rows (deleted_at set) are removed
+from Redis, together with the precomputed book->game neighbor tables that list any deleted or re-embedded game. Work
+is proportional to the churn, not to the catalog size.
+
+A TRUNCATE (e.g. the bulk loader's) leaves no tombstones, so after one, and every SYNC_RECONCILE_INTERVAL seconds
+in any case, the game IDs in Redis are reconciled with PostgreSQL and the games it no longer has are purged.
+
+Requires the change tracking columns and trigger from loader_to_postgres_games.ensure_change_tracking, which this
+script adds on start if they are missing.
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+from prometheus_client import start_http_server
+
+from cache.cache import bump_index_version
+from cache.embedding_store import EmbeddingStore, encode_texts
+from cache.neighbor_tables import GAME_NEIGHBORS, drop_tables_listing, mark_changed
+from cache.redis_utils import get_ingest_redis_client
+from config.autocomplete import GAME_SUGGESTIONS_KEY, add_game_suggestion
+from config.logger_config import setup_logger
+from config.metrics_config import SYNC_LAG, SYNC_ROWS, SYNC_BATCH_DURATION
+from config.model_provider import MODEL_NAME
+from config.projection import project
+from config.storage import STORAGE_LAYOUT, LAYOUT_HASH, EMBEDDING_FIELD, blob_to_vector
+from loader_to_postgres_games import DATABASE_URL, GAMES_TABLE, GAMES_RELOADS_TABLE, GAME_COLUMNS, connect, \
+    ensure_change_tracking
+from vectorize_igdb_in_redis_as_json import build_game_text, build_game_document, write_game
+
+# Setup logger
+logger = setup_logger()
+
+# Load environment variables
+load_dotenv()
+
+SYNC_BATCH_SIZE = int(os.getenv('GABS_SYNC_BATCH_SIZE', 500))
+SYNC_INTERVAL_SECONDS = float(os.getenv('GABS_SYNC_INTERVAL', 5))
+# Rows newer than this are left for the next run, so a transaction that commits late with an older updated_at is
+# not skipped by the watermark
+SYNC_SAFETY_LAG_SECONDS = float(os.getenv('GABS_SYNC_SAFETY_LAG', 5))
+SYNC_METRICS_PORT = int(os.getenv('GABS_SYNC_METRICS_PORT', 8001))
+SYNC_RECONCILE_INTERVAL_SECONDS = float(os.getenv('GABS_SYNC_RECONCILE_INTERVAL', 3600))
+
+WATERMARK_KEY = f"sync:{GAMES_TABLE}:watermark"
+# game ID -> hash of the text its stored embedding was computed from
+TEXT_HASHES_KEY = f"sync:{GAMES_TABLE}:text_hash"
+# PostgreSQL time of the last reconciliation
+RECONCILED_AT_KEY = f"sync:{GAMES_TABLE}:reconciled_at"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+r = get_ingest_redis_client()
+r_binary = get_ingest_redis_client(decode_responses=False)
+
+
+def read_watermark():
+    """Return the (updated_at, id) of the last synced row."""
+    watermark = r.hgetall(WATERMARK_KEY)
+    if not watermark:
+        return EPOCH, 0
+    return datetime.fromisoformat(watermark['updated_at']), int(watermark['id'])
+
+
+def write_watermark(updated_at, game_id):
+    r.hset(WATERMARK_KEY, mapping={'updated_at': updated_at.isoformat(), 'id': game_id})
+
+
+def fetch_changes(connection, watermark, limit=SYNC_BATCH_SIZE):
+    """Return up to `limit` rows changed after the watermark, oldest first, as dicts."""
+    updated_at, game_id = watermark
+    columns = GAME_COLUMNS + ["updated_at", "deleted_at"]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {', '.join(columns)} FROM {GAMES_TABLE} "
+            f"WHERE (updated_at, id) > (%s, %s) AND updated_at < now() - %s "
+            f"ORDER BY updated_at, id LIMIT %s",
+            (updated_at, game_id, timedelta(seconds=SYNC_SAFETY_LAG_SECONDS), limit))
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    # The read-only transaction would otherwise pin an old snapshot across polls
+    connection.commit()
+    return rows
+
+
+def pending_lag_seconds(connection, watermark):
+    """Age of the oldest change past the watermark, or 0 when Redis is caught up."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT now() - min(updated_at) FROM {GAMES_TABLE} WHERE (updated_at, id) > (%s, %s)",
+                       watermark)
+        lag = cursor.fetchone()[0]
+    connection.commit()
+    return lag.total_seconds() if lag is not None else 0.0
+
+
+def text_hash(game):
+    return EmbeddingStore.key_for(MODEL_NAME, build_game_text(game))
+
+
+def get_stored_embeddings(game_ids, layout=STORAGE_LAYOUT):
+    """Return the embeddings already in Redis for game_ids (None where missing), in one pipeline."""
+    if layout == LAYOUT_HASH:
+        pipe = r_binary.pipeline(transaction=False)
+        for game_id in game_ids:
+            pipe.hget(f"game:{game_id}", EMBEDDING_FIELD)
+        return [blob_to_vector(blob) if blob else None for blob in pipe.execute()]
+    pipe = r.pipeline(transaction=False)
+    for game_id in game_ids:
+        pipe.json().get(f"game:{game_id}", "$.embedding")
+    return [np.asarray(embedding[0], dtype=np.float32) if embedding else None for embedding in pipe.execute()]
+
+
+def sync_batch(rows, layout=STORAGE_LAYOUT):
+    """Apply one batch of changed rows to Redis. Returns the number of (upserted, reembedded, deleted) games."""
+    deleted = [row for row in rows if row['deleted_at'] is not None]
+    # Drop NULL columns, so the document builders fall back to their defaults
+    games = [{column: row[column] for column in GAME_COLUMNS if row[column] is not None}
+             for row in rows if row['deleted_at'] is None]
+
+    hashes = [text_hash(game) for game in games]
+    stored_hashes = r.hmget(TEXT_HASHES_KEY, [game['id'] for game in games]) if games else []
+    unchanged = [i for i, (new, old) in enumerate(zip(hashes, stored_hashes)) if new == old]
+    embeddings = [None] * len(games)
+    for i, embedding in zip(unchanged, get_stored_embeddings([games[i]['id'] for i in unchanged], layout)):
+        embeddings[i] = embedding
+
+    # Only games whose text changed (or whose vector is missing from Redis) go through the model
+    reembed = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if reembed:
+        vectors = project(encode_texts([build_game_text(games[i]) for i in reembed], MODEL_NAME,
+                                       batch_size=len(reembed)))
+        for i, vector in zip(reembed, vectors):
+            embeddings[i] = vector
+
+    pipe = r.pipeline(transaction=False)
+    for game, embedding, game_hash in zip(games, embeddings, hashes):
+        write_game(pipe, build_game_document(game, embedding), layout)
+        pipe.hset(TEXT_HASHES_KEY, game['id'], game_hash)
+    # A changed name always changes the text hash, so only re-embedded games can bring a new title. PostgreSQL does
+    # not hold the IGDB popularity, so they get the base weight until the next full load.
+    for i in reembed:
+        add_game_suggestion(pipe, games[i])
+    for row in deleted:
+        queue_game_removal(pipe, row['id'], row['name'])
+    pipe.execute()
+
+    invalidate_neighbor_tables([str(row['id']) for row in deleted] + [str(games[i]['id']) for i in reembed])
+    return len(games), len(reembed), len(deleted)
+
+
+def queue_game_removal(pipe, game_id, name):
+    pipe.delete(f"game:{game_id}")
+    pipe.hdel(TEXT_HASHES_KEY, game_id)
+    if name:
+        pipe.execute_command("FT.SUGDEL", GAME_SUGGESTIONS_KEY, name)
+
+
+def invalidate_neighbor_tables(game_ids):
+    """
+    Precomputed book->game tables listing a deleted or re-embedded game are stale: drop them so those books use the
+    live query, and mark the games changed so the next precompute_neighbors.py run rebuilds and merges them.
+    """
+    if not game_ids:
+        return
+    dropped = drop_tables_listing(r, GAME_NEIGHBORS, game_ids)
+    mark_changed(r, "game", game_ids)
+    if dropped:
+        logger.info(f"[sync] {len(dropped)} precomputed book->game tables dropped")
+
+
+def needs_reconcile(connection):
+    """Return PostgreSQL's current time if the catalog was truncated or the interval passed since the last run."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT now(), (SELECT max(reloaded_at) FROM {GAMES_RELOADS_TABLE})")
+        now, reloaded_at = cursor.fetchone()
+    connection.commit()
+    reconciled_at = r.get(RECONCILED_AT_KEY)
+    if reconciled_at is None:
+        return now
+    reconciled_at = datetime.fromisoformat(reconciled_at)
+    if (reloaded_at is not None and reloaded_at > reconciled_at) or \
+            now - reconciled_at > timedelta(seconds=SYNC_RECONCILE_INTERVAL_SECONDS):
+        return now
+    return None
+
+
+def reconcile(connection, started_at, layout=STORAGE_LAYOUT):
+    """Purge the games Redis holds but PostgreSQL no longer has (or only as tombstones). Returns how many."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT id FROM {GAMES_TABLE} WHERE deleted_at IS NULL")
+        live_ids = {str(row[0]) for row in cursor.fetchall()}
+    connection.commit()
+    gone = [key.split(":", 1)[1] for key in r.scan_iter(match="game:*", count=1000)]
+    gone = [game_id for game_id in gone if game_id not in live_ids]
+
+    for start in range(0, len(gone), SYNC_BATCH_SIZE):
+        game_ids = gone[start:start + SYNC_BATCH_SIZE]
+        pipe = r.pipeline(transaction=False)
+        for game_id in game_ids:
+            if layout == LAYOUT_HASH:
+                pipe.hget(f"game:{game_id}", "name")
+            else:
+                pipe.json().get(f"game:{game_id}", "$.name")
+        names = [name[0] if isinstance(name, list) and name else name for name in pipe.execute()]
+        pipe = r.pipeline(transaction=False)
+        for game_id, name in zip(game_ids, names):
+            queue_game_removal(pipe, game_id, name)
+        pipe.execute()
+        invalidate_neighbor_tables(game_ids)
+
+    r.set(RECONCILED_AT_KEY, started_at.isoformat())
+    logger.info(f"[sync] Reconciled with {GAMES_TABLE}: {len(gone)} games purged")
+    return len(gone)
+
+
+def sync_once(connection, batch_size=SYNC_BATCH_SIZE, layout=STORAGE_LAYOUT):
+    """Sync every change past the watermark, batch by batch, reconciling first when due. Returns the totals."""
+    totals = {'upserted': 0, 'reembedded': 0, 'deleted': 0, 'purged': 0}
+    reconcile_started_at = needs_reconcile(connection)
+    if reconcile_started_at is not None:
+        totals['purged'] = reconcile(connection, reconcile_started_at, layout)
+        SYNC_ROWS.labels('purged').inc(totals['purged'])
+    watermark = read_watermark()
+    while True:
+        rows = fetch_changes(connection, watermark, batch_size)
+        if not rows:
+            break
+        started = time.perf_counter()
+        upserted, reembedded, deleted = sync_batch(rows, layout)
+        SYNC_BATCH_DURATION.observe(time.perf_counter() - started)
+
+        watermark = (rows[-1]['updated_at'], rows[-1]['id'])
+        write_watermark(*watermark)
+        for action, count in (('upserted', upserted), ('reembedded', reembedded), ('deleted', deleted)):
+            SYNC_ROWS.labels(action).inc(count)
+            totals[action] += count
+        logger.info(f"[sync] {len(rows)} changes applied ({upserted} upserted, {reembedded} re-embedded, "
+                    f"{deleted} deleted), watermark {watermark[0].isoformat()}")
+        if len(rows) < batch_size:
+            break
+
+    SYNC_LAG.set(pending_lag_seconds(connection, watermark))
+    if any(totals.values()):
+        # Cached search results may include the changed games
+        bump_index_version()
+    return totals
+
+
+def run_sync(interval=SYNC_INTERVAL_SECONDS, database_url=DATABASE_URL):
+    """Poll PostgreSQL for changes forever, exposing the sync metrics on SYNC_METRICS_PORT."""
+    start_http_server(SYNC_METRICS_PORT)
+    connection = connect(database_url)
+    ensure_change_tracking(connection)
+    logger.info(f"[sync] Watching {GAMES_TABLE} every {interval}s from watermark {read_watermark()[0].isoformat()}")
+    while True:
+        started = time.perf_counter()
+        try:
+            totals = sync_once(connection)
+        except Exception as e:
+            logger.error(f"[sync] Sync run failed, retrying in {interval}s: {e}")
+            connection.close()
+            time.sleep(interval)
+            connection = connect(database_url)
+            continue
+        seconds = time.perf_counter() - started
+        changes = totals['upserted'] + totals['deleted'] + totals['purged']
+        if changes:
+            logger.info(f"[sync] {changes} changes in {seconds:.2f}s ({changes / seconds:.1f} rows/sec)")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    run_sync()
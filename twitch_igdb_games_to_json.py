@@ -1,13 +1,19 @@
 import os
+import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 
-import redis
 from dotenv import load_dotenv
 from igdb.wrapper import IGDBWrapper
+from redis.commands.search.query import Query
 
+from cache.redis_utils import get_read_redis_client
+from config.autocomplete import prefix_query_text
 from config.index_names import GAMES_INDEX
+from config.instrumentation import search, timed, STAGE_SHAPING
 from config.logger_config import setup_logger
+from config.storage import STORAGE_LAYOUT, LAYOUT_HASH
 
 # Load environment variables
 load_dotenv()
@@ -17,31 +23,160 @@ CLIENT_ACCESS_TOKEN = os.getenv("TWITCH_CLIENT_ACCESS_TOKEN")
 # Setup logger
 logger = setup_logger()
 
-r = redis.Redis.from_url(os.getenv("GABS_REDIS_URL"))
-
+r = get_read_redis_client()
+
+
+# IGDB allows 4 requests per second and up to 8 open requests per client
+IGDB_RATE_LIMIT = float(os.getenv('GABS_IGDB_RATE_LIMIT', 4))
+IGDB_CONCURRENCY = int(os.getenv('GABS_IGDB_CONCURRENCY', 4))
+IGDB_MAX_RETRIES = int(os.getenv('GABS_IGDB_MAX_RETRIES', 5))
+IGDB_PAGE_SIZE = 500
+GAMES_FILE = "data/games_list.json"
+FETCH_CHECKPOINT_FILE = os.getenv('GABS_IGDB_FETCH_CHECKPOINT', "./data/games_fetch.checkpoint")
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursting up to `capacity` (1 by default, i.e. evenly spaced)."""
+
+    def __init__(self, rate=IGDB_RATE_LIMIT, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or 1
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def games_page_query(offset, limit=IGDB_PAGE_SIZE):
+    # total_rating_count weights the game's name in the autocomplete dictionary
+    return (f'fields name, category, cover, first_release_date, slug, storyline, summary, url, total_rating_count; '
+            f'limit {limit}; offset {offset};')
+
+
+def fetch_games_page(wrapper, limiter, offset, limit=IGDB_PAGE_SIZE, max_retries=IGDB_MAX_RETRIES):
+    """Fetch one page of games, retrying with exponential backoff (e.g. on HTTP 429)."""
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            return json.loads(wrapper.api_request('games', games_page_query(offset, limit)))
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            backoff = min(2 ** attempt, 30)
+            logger.warning(f"IGDB request at offset {offset} failed ({e}), retrying in {backoff}s")
+            time.sleep(backoff)
+
+
+def read_fetch_checkpoint(checkpoint_file, output_file):
+    """Return the saved fetch state for output_file, or None if there is no usable checkpoint."""
+    if not checkpoint_file or not os.path.isfile(checkpoint_file) or not os.path.isfile(output_file):
+        return None
+    with open(checkpoint_file, 'r', encoding="utf-8") as file:
+        checkpoint = json.load(file)
+    if checkpoint.get('output_file') != os.path.abspath(output_file):
+        logger.info(f"Ignoring checkpoint {checkpoint_file}: it belongs to {checkpoint.get('output_file')}")
+        return None
+    return checkpoint
+
+
+def write_fetch_checkpoint(checkpoint_file, output_file, offset, count, position):
+    """Atomically record that every page before `offset` is in the first `position` bytes of output_file."""
+    tmp_file = f"{checkpoint_file}.tmp"
+    with open(tmp_file, 'w', encoding="utf-8") as file:
+        json.dump({'output_file': os.path.abspath(output_file), 'offset': offset, 'count': count,
+                   'position': position}, file)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def fetch_all_games(wrapper, output_file=GAMES_FILE, checkpoint_file=FETCH_CHECKPOINT_FILE, resume=True,
+                    concurrency=IGDB_CONCURRENCY, page_size=IGDB_PAGE_SIZE, limiter=None):
+    """
+    Page through IGDB with up to `concurrency` requests in flight under a token-bucket rate limit, streaming the games
+    into output_file as a JSON array. Returns the number of games written.
 
-def fetch_all_games(wrapper):
+    Pages are written in offset order, so at most `concurrency` pages are held in memory, and the checkpoint always
+    describes a valid prefix of the file: a resumed run truncates the file to it and continues from the next offset.
+    `wrapper` only needs an IGDBWrapper-style `api_request(endpoint, query)` method returning the JSON response bytes.
+    """
+    limiter = limiter or TokenBucket()
+    state = read_fetch_checkpoint(checkpoint_file, output_file) if resume else None
+    if state:
+        logger.info(f"Resuming the IGDB fetch at offset {state['offset']} ({state['count']} games already written)")
+        file = open(output_file, 'r+b')
+        file.seek(state['position'])
+        file.truncate()
+        offset, count = state['offset'], state['count']
+    else:
+        file = open(output_file, 'wb')
+        file.write(b"[")
+        offset, count = 0, 0
+
+    with file, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {}
+        next_offset = offset
+        while True:
+            while len(in_flight) < concurrency:
+                in_flight[next_offset] = pool.submit(fetch_games_page, wrapper, limiter, next_offset, page_size)
+                next_offset += page_size
+
+            page = in_flight.pop(offset).result()
+            for game in page:
+                file.write((",\n" if count else "\n").encode("utf-8"))
+                file.write(json.dumps(game, ensure_ascii=False).encode("utf-8"))
+                count += 1
+            offset += page_size
+            file.flush()
+            if checkpoint_file:
+                write_fetch_checkpoint(checkpoint_file, output_file, offset, count, file.tell())
+            logger.info(f"Fetched {count} games so far (offset {offset})")
+
+            if len(page) < page_size:
+                # Past the end of the catalog: the requests still in flight can only come back empty
+                for future in in_flight.values():
+                    future.cancel()
+                break
+
+        file.write(b"\n]\n")
+
+    # The file is complete, so the next run starts a fresh fetch
+    if checkpoint_file and os.path.isfile(checkpoint_file):
+        os.remove(checkpoint_file)
+    return count
+
+
+def games_by_name_query(game_name):
+    # User input is escaped, so query syntax in a game name (e.g. "Half-Life: Alyx") is matched literally
+    name_query = prefix_query_text(game_name)
+    query_str = f"@name:({name_query})" if name_query else "*"
+    if STORAGE_LAYOUT == LAYOUT_HASH:
+        # Only return the text fields: the HASH also holds the raw vector blob
+        return Query(query_str).return_fields("name", "summary", "url")
+    return Query(query_str)
+
+
+def shape_games(docs):
     games = []
-    offset = 0
-    limit = 500
-    has_more = True
-
-    while has_more:
-        logger.info("We have more games to fetch! Offset: {0}".format(offset))
-        query = (f'fields name, category, cover, first_release_date, slug, storyline, summary, url; limit {limit}; '
-                 f'offset {offset};')
-        response = wrapper.api_request('games', query)
-        current_batch = json.loads(response)
-
-        if not current_batch:
-            has_more = False
+    for document in docs:
+        if STORAGE_LAYOUT == LAYOUT_HASH:
+            games.append({"name": document.name, "summary": getattr(document, "summary", ""),
+                          "url": getattr(document, "url", "")})
         else:
-            games.extend(current_batch)
-            offset += limit
-
-        # Respect the rate limit: 4 requests per second
-        time.sleep(1)  # Adjust based on actual performance and safety margin
-
+            # Extract the JSON data from the Document object and parse it
+            game_data = json.loads(document.json)
+            dict_for_game = {"name": game_data["name"], "summary": game_data["summary"], "url": game_data["url"]}
+            games.append(dict_for_game)
     return games
 
 
@@ -53,19 +188,14 @@ def search_games_by_name(game_name):
     :return: A list of games that match the search query.
     """
     index_name = GAMES_INDEX  # Assuming GAMES_INDEX is the name of your Redisearch index for games
+    if not game_name.strip():
+        return []
 
     try:
-        query_str = f"@name:({game_name}*)"  # Adjust based on your index's schema
-
         # Execute the search query against the index
-        search_results = r.ft(index_name).search(query_str)
-
-        # Extract the JSON data from the Document object and parse it
-        games = []
-        for document in search_results.docs:
-            game_data = json.loads(document.json)
-            dict_for_game = {"name": game_data["name"], "summary": game_data["summary"], "url": game_data["url"]}
-            games.append(dict_for_game)
+        search_results = search(r, index_name, games_by_name_query(game_name))
+        with timed(STAGE_SHAPING):
+            games = shape_games(search_results.docs)
 
         logger.info(f"Found {len(games)} games for query '{game_name}'")
         return games
@@ -75,17 +205,11 @@ def search_games_by_name(game_name):
         return []
 
 
-
 def main():
     wrapper = IGDBWrapper(CLIENT_ID, CLIENT_ACCESS_TOKEN)
-    all_games = fetch_all_games(wrapper)
-    print(f"Total games fetched: {len(all_games)}")
-    # Here you can add your logic to persist the `all_games` list to a PostgreSQL table
-
-    # Writing the list of games to a file
-    with open('data/games_list.json', 'w', encoding='utf-8') as f:
-        json.dump(all_games, f, ensure_ascii=False, indent=4)
-    logger.info("The games list has been written to 'games_list.json'.")
+    total_games = fetch_all_games(wrapper, GAMES_FILE)
+    print(f"Total games fetched: {total_games}")
+    logger.info(f"The games list has been written to '{GAMES_FILE}'.")
 
 
 # Press the green button in the gutter to run the script.